@@ -1,4 +1,4 @@
-from .agents import VariantEvidenceAgent, FunctionalEvidenceAgent, CohortEvidenceAgent, SegregationEvidenceAgent
+from .agents import VariantEvidenceAgent, FunctionalEvidenceAgent, CohortEvidenceAgent, SegregationEvidenceAgent, CombinedEvidenceAgent
 from .orchestrator import EvidenceExtractionOrchestrator
 
 __all__ = [
@@ -6,5 +6,6 @@ __all__ = [
     'FunctionalEvidenceAgent',
     'CohortEvidenceAgent',
     'SegregationEvidenceAgent',
+    'CombinedEvidenceAgent',
     'EvidenceExtractionOrchestrator'
 ]
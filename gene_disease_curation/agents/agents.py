@@ -1,223 +1,397 @@
+import asyncio
+import functools
 from typing import Optional, Dict, List
+import openai
+from langchain_core.exceptions import OutputParserException
 from langchain_core.prompts import PromptTemplate
-from langchain.output_parsers import PydanticOutputParser
+from pydantic import ValidationError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 
-from ..models.evidence import VariantEvidence, FunctionalEvidence, CohortEvidence, SegregationEvidence
+from ..cache import llm_cache
+from ..config import SETTINGS, llm_semaphore
+from ..models.evidence import VariantEvidence, FunctionalEvidence, CohortEvidence, SegregationEvidence, CombinedEvidence
 from ..models.state import AbstractEvidence, EvidenceType, EvidenceLevel
 
-class VariantEvidenceAgent:
-    def __init__(self, llm):
-        self.llm = llm
-        self.parser = PydanticOutputParser(pydantic_object=VariantEvidence)
-        
-        self.prompt = PromptTemplate(
-            template="""Analyze this abstract for genetic variants in {gene} related to {disease}.
-            
-Look for: specific variants, variant types, patient counts, inheritance patterns, pathogenicity.
+
+# Static rubrics, shared by the single-type agents and the combined agent
+VARIANT_RUBRIC = """Look for: specific variants, variant types, patient counts, inheritance patterns, pathogenicity.
 
 Evidence levels:
 - STRONG: Multiple patients, clear pathogenic variants, segregation data
-- MODERATE: Few patients but clear variant descriptions  
-- WEAK: Variants mentioned but limited detail
+- MODERATE: Few patients but clear variant descriptions
+- WEAK: Variants mentioned but limited detail"""
+
+FUNCTIONAL_RUBRIC = """Look for: experimental methods, assays, model organisms, rescue experiments, mechanism.
+
+Evidence levels:
+- STRONG: Clear functional defects, rescue experiments, mechanism shown
+- MODERATE: Basic functional studies with disease relevance
+- WEAK: Functional studies mentioned but limited detail"""
+
+COHORT_RUBRIC = """Look for: patient numbers, study design, statistics, controls.
+
+Evidence levels:
+- STRONG: Large cohort (>50), controls, statistical significance
+- MODERATE: Medium cohort (10-50) or good design
+- WEAK: Small cohort (<10) or case series"""
+
+SEGREGATION_RUBRIC = """Look for: families studied, affected members, inheritance patterns, segregation confirmation.
+
+Evidence levels:
+- STRONG: Multiple families, clear segregation
+- MODERATE: Few families but clear segregation
+- WEAK: Family data mentioned but limited"""
+
+
+# Bump whenever prompts or response formats change so stale cache entries are not reused
+PROMPT_VERSION = "3"
+
+
+def cache_key(agent_name: str, gene: str, disease: str, abstract: str) -> str:
+    """LLM cache key for one agent's response to one abstract"""
+    return llm_cache.make_key(
+        agent_name, PROMPT_VERSION, SETTINGS["llm_model"], SETTINGS["llm_temperature"], gene, disease, abstract
+    )
+
+
+# Errors that mean this abstract's output was unusable; anything else (rate limits,
+# connection errors) propagates so it can be retried
+EXTRACTION_ERRORS = (ValidationError, OutputParserException, ValueError, asyncio.TimeoutError)
 
-Abstract: {abstract}
+# Applied to every analyze(): back off and retry when the provider throttles or drops us
+retry_transient = retry(
+    retry=retry_if_exception_type((openai.RateLimitError, openai.APIConnectionError)),
+    wait=wait_exponential(multiplier=1, max=30),
+    stop=stop_after_attempt(5),
+    reraise=True
+)
 
-{format_instructions}""",
-            input_variables=["gene", "disease", "abstract"],
-            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+
+def _raw_data(result) -> Optional[Dict]:
+    """The full parsed model for AbstractEvidence.raw_data, only kept when configured"""
+    if not SETTINGS["keep_raw_evidence"]:
+        return None
+    return result.model_dump(mode="json", exclude_unset=True)
+
+
+@functools.lru_cache(maxsize=256)
+def _prompt_head(template: str, gene: str, disease: str) -> str:
+    """Render the part of a template before {abstract}, which only depends on gene and disease"""
+    return template.format(gene=gene, disease=disease, abstract="")
+
+
+def render_prompt(prompt: PromptTemplate, gene: str, disease: str, abstract: str) -> str:
+    """Render an agent prompt; every template ends with {abstract}, so the head is reused"""
+    return _prompt_head(prompt.template, gene, disease) + abstract
+
+
+async def _invoke_cached(structured_llm, schema, agent_name: str, prompt_text: str, gene: str, disease: str, abstract: str):
+    """Invoke the structured-output LLM, reusing a cached result for the same agent/gene/disease/abstract"""
+    fresh = None
+
+    async def compute() -> str:
+        nonlocal fresh
+        # only cache misses take a concurrency slot
+        async with llm_semaphore():
+            fresh = await structured_llm.ainvoke(prompt_text)
+        return fresh.model_dump_json()
+
+    cached = await llm_cache.get_or_compute(cache_key(agent_name, gene, disease, abstract), compute)
+    if fresh is not None:
+        # the structured-output parser already validated it; don't round-trip it through JSON again
+        return fresh
+    # pydantic-core parses the JSON straight into the model, no intermediate dict
+    return schema.model_validate_json(cached)
+
+
+class VariantEvidenceAgent:
+    # built once per process, shared by every instance
+    schema = VariantEvidence
+    prompt = PromptTemplate(
+        template="""Analyze the abstract below for genetic variants in the given gene related to the given disease.
+
+""" + VARIANT_RUBRIC + """
+
+Gene: {gene}
+Disease: {disease}
+Abstract: {abstract}""",
+        input_variables=["gene", "disease", "abstract"]
+    )
+
+    def __init__(self, llm):
+        self.llm = llm
+        # OpenAI's native JSON-schema mode; no format instructions or output parsing needed
+        self.structured_llm = llm.with_structured_output(VariantEvidence, method="json_schema")
+
+    @staticmethod
+    def to_evidence(pmid: str, result: Optional[VariantEvidence]) -> Optional[AbstractEvidence]:
+        """Convert a parsed VariantEvidence into an AbstractEvidence item"""
+        if result is None or not result.has_evidence:
+            return None
+
+        return AbstractEvidence(
+            pmid=pmid,
+            evidence_type=EvidenceType.VARIANT,
+            evidence_level=EvidenceLevel(result.evidence_level.lower()),
+            description=result.description,
+            confidence=result.confidence,
+            extracted_by="VariantEvidenceAgent",
+            key_terms=result.key_terms[:5],
+            raw_data=_raw_data(result)
         )
-    
+
+    @retry_transient
     async def analyze(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> Optional[AbstractEvidence]:
-        
         try:
-            response = await self.llm.ainvoke(
-                self.prompt.format(
-                    gene=gene,
-                    disease=disease,
-                    abstract=abstract_data["abstract"][:1500]
-                )
-            )
-            
-            result = self.parser.parse(response.content)
-            
-            #     (Pdb) result
-            # VariantEvidence(has_evidence=True, evidence_level='WEAK', variants_found=[], variant_types=[], num_patients=None, inheritance_pattern='de novo', description='The abstract discusses the role of de novo variants in the SCN1A gene related to Dravet syndrome, but does not specify particular variants or patient counts.', confidence=0.5, key_terms=['Dravet syndrome', 'SCN1A', 'de novo variants', 'haploinsufficiency', 'TANGO technology'])
-            #     import pdb; pdb.set_trace()
-            if not result.has_evidence:
-                # import pdb; pdb.set_trace()
-                return None
-            
-            return AbstractEvidence(
-                pmid=pmid,
-                evidence_type=EvidenceType.VARIANT,
-                evidence_level=EvidenceLevel(result.evidence_level.lower()),
-                description=result.description,
-                confidence=result.confidence,
-                extracted_by="VariantEvidenceAgent",
-                key_terms=result.key_terms[:5],
-                raw_data=result.dict()
+            abstract = abstract_data["abstract"]
+            result = await _invoke_cached(
+                self.structured_llm,
+                self.schema,
+                "VariantEvidenceAgent",
+                render_prompt(self.prompt, gene, disease, abstract),
+                gene,
+                disease,
+                abstract
             )
-        except Exception as e:
-            
+
+            return self.to_evidence(pmid, result)
+        except EXTRACTION_ERRORS as e:
             print(f"Error in VariantEvidenceAgent: {e}")
-            import pdb; pdb.set_trace()
             return None
 
 
 class FunctionalEvidenceAgent:
+    schema = FunctionalEvidence
+    prompt = PromptTemplate(
+        template="""Analyze the abstract below for functional studies of the given gene related to the given disease.
+
+""" + FUNCTIONAL_RUBRIC + """
+
+Gene: {gene}
+Disease: {disease}
+Abstract: {abstract}""",
+        input_variables=["gene", "disease", "abstract"]
+    )
+
     def __init__(self, llm):
         self.llm = llm
-        self.parser = PydanticOutputParser(pydantic_object=FunctionalEvidence)
-        
-        self.prompt = PromptTemplate(
-            template="""Analyze this abstract for functional studies of {gene} related to {disease}.
-
-Look for: experimental methods, assays, model organisms, rescue experiments, mechanism.
+        self.structured_llm = llm.with_structured_output(FunctionalEvidence, method="json_schema")
 
-Evidence levels:
-- STRONG: Clear functional defects, rescue experiments, mechanism shown
-- MODERATE: Basic functional studies with disease relevance
-- WEAK: Functional studies mentioned but limited detail
+    @staticmethod
+    def to_evidence(pmid: str, result: Optional[FunctionalEvidence]) -> Optional[AbstractEvidence]:
+        """Convert a parsed FunctionalEvidence into an AbstractEvidence item"""
+        if result is None or not result.has_evidence:
+            return None
 
-Abstract: {abstract}
+        confidence = result.confidence * 1.2 if result.rescue_experiment else result.confidence
 
-{format_instructions}""",
-            input_variables=["gene", "disease", "abstract"],
-            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+        return AbstractEvidence(
+            pmid=pmid,
+            evidence_type=EvidenceType.FUNCTIONAL,
+            evidence_level=EvidenceLevel(result.evidence_level.lower()),
+            description=result.description,
+            confidence=min(1.0, confidence),
+            extracted_by="FunctionalEvidenceAgent",
+            key_terms=result.experiment_types[:3],
+            raw_data=_raw_data(result)
         )
-    
+
+    @retry_transient
     async def analyze(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> Optional[AbstractEvidence]:
         try:
-            response = await self.llm.ainvoke(
-                self.prompt.format(
-                    gene=gene,
-                    disease=disease,
-                    abstract=abstract_data["abstract"][:1500]
-                )
+            abstract = abstract_data["abstract"]
+            result = await _invoke_cached(
+                self.structured_llm,
+                self.schema,
+                "FunctionalEvidenceAgent",
+                render_prompt(self.prompt, gene, disease, abstract),
+                gene,
+                disease,
+                abstract
             )
-            
-            result = self.parser.parse(response.content)
-            # import pdb; pdb.set_trace()
-            # (Pdb) result
-            # FunctionalEvidence(has_evidence=False, evidence_level='WEAK', experiment_types=[], key_findings=[], disease_mechanism=None, rescue_experiment=False, description='The abstract discusses Dravet syndrome and its association with SCN1A mutations but lacks specific details on experimental methods, assays, model organisms, or any functional studies.', confidence=2.0)
-            
-            
-            if not result.has_evidence:
-                return None
-            
-            confidence = result.confidence * 1.2 if result.rescue_experiment else result.confidence
-            
-            return AbstractEvidence(
-                pmid=pmid,
-                evidence_type=EvidenceType.FUNCTIONAL,
-                evidence_level=EvidenceLevel(result.evidence_level.lower()),
-                description=result.description,
-                confidence=min(1.0, confidence),
-                extracted_by="FunctionalEvidenceAgent",
-                key_terms=result.experiment_types[:3],
-                raw_data=result.dict()
-            )
-        except:
+
+            return self.to_evidence(pmid, result)
+        except EXTRACTION_ERRORS as e:
+            print(f"Error in FunctionalEvidenceAgent: {e}")
             return None
 
 
 class CohortEvidenceAgent:
-    def __init__(self, llm):
-        self.llm = llm
-        self.parser = PydanticOutputParser(pydantic_object=CohortEvidence)
-        
-        self.prompt = PromptTemplate(
-            template="""Analyze this abstract for cohort/population studies of {gene} and {disease}.
+    schema = CohortEvidence
+    prompt = PromptTemplate(
+        template="""Analyze the abstract below for cohort/population studies of the given gene and disease.
 
-Look for: patient numbers, study design, statistics, controls.
+""" + COHORT_RUBRIC + """
 
-Evidence levels:
-- STRONG: Large cohort (>50), controls, statistical significance
-- MODERATE: Medium cohort (10-50) or good design
-- WEAK: Small cohort (<10) or case series
+Gene: {gene}
+Disease: {disease}
+Abstract: {abstract}""",
+        input_variables=["gene", "disease", "abstract"]
+    )
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.structured_llm = llm.with_structured_output(CohortEvidence, method="json_schema")
 
-Abstract: {abstract}
+    @staticmethod
+    def to_evidence(pmid: str, result: Optional[CohortEvidence]) -> Optional[AbstractEvidence]:
+        """Convert a parsed CohortEvidence into an AbstractEvidence item"""
+        if result is None or not result.has_evidence:
+            return None
 
-{format_instructions}""",
-            input_variables=["gene", "disease", "abstract"],
-            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+        return AbstractEvidence(
+            pmid=pmid,
+            evidence_type=EvidenceType.COHORT,
+            evidence_level=EvidenceLevel(result.evidence_level.lower()),
+            description=result.description,
+            confidence=result.confidence,
+            extracted_by="CohortEvidenceAgent",
+            key_terms=[result.study_type],
+            raw_data=_raw_data(result)
         )
-    
+
+    @retry_transient
     async def analyze(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> Optional[AbstractEvidence]:
         try:
-            response = await self.llm.ainvoke(
-                self.prompt.format(
-                    gene=gene,
-                    disease=disease,
-                    abstract=abstract_data["abstract"][:1500]
-                )
+            abstract = abstract_data["abstract"]
+            result = await _invoke_cached(
+                self.structured_llm,
+                self.schema,
+                "CohortEvidenceAgent",
+                render_prompt(self.prompt, gene, disease, abstract),
+                gene,
+                disease,
+                abstract
             )
-            
-            result = self.parser.parse(response.content)
-            
-            if not result.has_evidence:
-                return None
-            
-            return AbstractEvidence(
-                pmid=pmid,
-                evidence_type=EvidenceType.COHORT,
-                evidence_level=EvidenceLevel(result.evidence_level.lower()),
-                description=result.description,
-                confidence=result.confidence,
-                extracted_by="CohortEvidenceAgent",
-                key_terms=[result.study_type],
-                raw_data=result.dict()
-            )
-        except:
+
+            return self.to_evidence(pmid, result)
+        except EXTRACTION_ERRORS as e:
+            print(f"Error in CohortEvidenceAgent: {e}")
             return None
 
 
 class SegregationEvidenceAgent:
-    def __init__(self, llm):
-        self.llm = llm
-        self.parser = PydanticOutputParser(pydantic_object=SegregationEvidence)
-        
-        self.prompt = PromptTemplate(
-            template="""Analyze this abstract for family segregation of {gene} with {disease}.
+    schema = SegregationEvidence
+    prompt = PromptTemplate(
+        template="""Analyze the abstract below for family segregation of the given gene with the given disease.
 
-Look for: families studied, affected members, inheritance patterns, segregation confirmation.
+""" + SEGREGATION_RUBRIC + """
 
-Evidence levels:
-- STRONG: Multiple families, clear segregation
-- MODERATE: Few families but clear segregation
-- WEAK: Family data mentioned but limited
+Gene: {gene}
+Disease: {disease}
+Abstract: {abstract}""",
+        input_variables=["gene", "disease", "abstract"]
+    )
 
-Abstract: {abstract}
+    def __init__(self, llm):
+        self.llm = llm
+        self.structured_llm = llm.with_structured_output(SegregationEvidence, method="json_schema")
 
-{format_instructions}""",
-            input_variables=["gene", "disease", "abstract"],
-            partial_variables={"format_instructions": self.parser.get_format_instructions()}
+    @staticmethod
+    def to_evidence(pmid: str, result: Optional[SegregationEvidence]) -> Optional[AbstractEvidence]:
+        """Convert a parsed SegregationEvidence into an AbstractEvidence item"""
+        if result is None or not result.has_evidence:
+            return None
+
+        return AbstractEvidence(
+            pmid=pmid,
+            evidence_type=EvidenceType.SEGREGATION,
+            evidence_level=EvidenceLevel(result.evidence_level.lower()),
+            description=result.description,
+            confidence=result.confidence,
+            extracted_by="SegregationEvidenceAgent",
+            key_terms=[result.inheritance_pattern] if result.inheritance_pattern else ["segregation"],
+            raw_data=_raw_data(result)
         )
-    
+
+    @retry_transient
     async def analyze(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> Optional[AbstractEvidence]:
         try:
-            response = await self.llm.ainvoke(
-                self.prompt.format(
-                    gene=gene,
-                    disease=disease,
-                    abstract=abstract_data["abstract"][:1500]
-                )
+            abstract = abstract_data["abstract"]
+            result = await _invoke_cached(
+                self.structured_llm,
+                self.schema,
+                "SegregationEvidenceAgent",
+                render_prompt(self.prompt, gene, disease, abstract),
+                gene,
+                disease,
+                abstract
             )
-            
-            result = self.parser.parse(response.content)
-            
-            if not result.has_evidence:
-                return None
-            
-            return AbstractEvidence(
-                pmid=pmid,
-                evidence_type=EvidenceType.SEGREGATION,
-                evidence_level=EvidenceLevel(result.evidence_level.lower()),
-                description=result.description,
-                confidence=result.confidence,
-                extracted_by="SegregationEvidenceAgent",
-                key_terms=[result.inheritance_pattern] if result.inheritance_pattern else ["segregation"],
-                raw_data=result.dict()
+
+            return self.to_evidence(pmid, result)
+        except EXTRACTION_ERRORS as e:
+            print(f"Error in SegregationEvidenceAgent: {e}")
+            return None
+
+
+class CombinedEvidenceAgent:
+    """Extracts all four evidence types from an abstract in a single LLM call"""
+
+    schema = CombinedEvidence
+    prompt = PromptTemplate(
+        template="""Analyze the abstract below for evidence linking the given gene to the given disease.
+Assess each of the four evidence types independently. Set a section to null, or its has_evidence to false, when the abstract has no evidence of that type.
+
+1. Variant evidence (genetic variants in the gene related to the disease)
+""" + VARIANT_RUBRIC + """
+
+2. Functional evidence (functional studies of the gene related to the disease)
+""" + FUNCTIONAL_RUBRIC + """
+
+3. Cohort evidence (cohort/population studies of the gene and disease)
+""" + COHORT_RUBRIC + """
+
+4. Segregation evidence (family segregation of the gene with the disease)
+""" + SEGREGATION_RUBRIC + """
+
+Gene: {gene}
+Disease: {disease}
+Abstract: {abstract}""",
+        input_variables=["gene", "disease", "abstract"]
+    )
+
+    def __init__(self, llm):
+        self.llm = llm
+        self.structured_llm = llm.with_structured_output(CombinedEvidence, method="json_schema")
+
+    @retry_transient
+    async def analyze(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> List[AbstractEvidence]:
+        try:
+            abstract = abstract_data["abstract"]
+            result = await _invoke_cached(
+                self.structured_llm,
+                self.schema,
+                "CombinedEvidenceAgent",
+                render_prompt(self.prompt, gene, disease, abstract),
+                gene,
+                disease,
+                abstract
             )
-        except:
-            return None
\ No newline at end of file
+        except EXTRACTION_ERRORS as e:
+            print(f"Error in CombinedEvidenceAgent: {e}")
+            return []
+
+        return self.to_evidence(pmid, result)
+
+    @staticmethod
+    def to_evidence(pmid: str, result: CombinedEvidence) -> List[AbstractEvidence]:
+        """Fan a parsed CombinedEvidence out through the single-type agents' converters"""
+        candidates = [
+            (VariantEvidenceAgent, result.variant),
+            (FunctionalEvidenceAgent, result.functional),
+            (CohortEvidenceAgent, result.cohort),
+            (SegregationEvidenceAgent, result.segregation),
+        ]
+
+        evidence_items = []
+        for agent_cls, sub_result in candidates:
+            try:
+                evidence = agent_cls.to_evidence(pmid, sub_result)
+            except ValueError as e:
+                # e.g. an evidence_level outside STRONG/MODERATE/WEAK
+                print(f"Error in CombinedEvidenceAgent ({agent_cls.__name__}): {e}")
+                continue
+            if evidence:
+                evidence_items.append(evidence)
+
+        return evidence_items
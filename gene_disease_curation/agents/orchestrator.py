@@ -1,10 +1,127 @@
 import asyncio
-from typing import List, Dict, Optional
+import functools
+from typing import List, Dict, Optional, Tuple
 from langchain.callbacks.tracers import LangChainTracer
 from langchain_openai import ChatOpenAI
+from openai import AsyncOpenAI
+import orjson
+import tiktoken
+from pydantic import ValidationError
+
+from ..cache import llm_cache, evidence_cache, cached_async
+from ..config import SETTINGS
+from ..models.state import AbstractEvidence, EvidenceType, EvidenceLevel
+from .agents import VariantEvidenceAgent, FunctionalEvidenceAgent, CohortEvidenceAgent, SegregationEvidenceAgent, CombinedEvidenceAgent, cache_key, render_prompt, PROMPT_VERSION
+
+try:
+    ENC = tiktoken.encoding_for_model(SETTINGS["llm_model"])
+except KeyError:
+    # model unknown to this tiktoken version; o200k_base is the gpt-4o family encoding
+    ENC = tiktoken.get_encoding("o200k_base")
+
+
+@functools.lru_cache(maxsize=1024)
+def truncate_abstract(text: str, max_tokens: int) -> str:
+    """Cut an abstract to max_tokens tokens; the limit is an argument so it is part of the cache key"""
+    tokens = ENC.encode(text)
+    if len(tokens) <= max_tokens:
+        return text
+    return ENC.decode(tokens[:max_tokens])
+
+
+def _evidence_key(orchestrator: "EvidenceExtractionOrchestrator", pmid: str, abstract_data: Dict, gene: str, disease: str) -> str:
+    """Evidence cache key for one abstract under the current agents, model and prompts"""
+    return evidence_cache.make_key(
+        "+".join(type(agent).__name__ for agent in orchestrator._active_agents()),
+        SETTINGS["llm_model"],
+        SETTINGS["llm_temperature"],
+        PROMPT_VERSION,
+        SETTINGS["max_abstract_tokens"],
+        SETTINGS["keep_raw_evidence"],
+        pmid,
+        gene,
+        disease,
+        abstract_data["abstract"]
+    )
+
+
+def _dump_evidence(evidence_items: List[AbstractEvidence]) -> str:
+    return orjson.dumps(evidence_items).decode("utf-8")
+
+
+def _load_evidence(value: str) -> List[AbstractEvidence]:
+    return [
+        AbstractEvidence(**{
+            **item,
+            "evidence_type": EvidenceType(item["evidence_type"]),
+            "evidence_level": EvidenceLevel(item["evidence_level"])
+        })
+        for item in orjson.loads(value)
+    ]
+
+
+def _dump_extraction(extraction: Tuple[List[AbstractEvidence], bool]) -> str:
+    return _dump_evidence(extraction[0])
+
+
+def _load_extraction(value: str) -> Tuple[List[AbstractEvidence], bool]:
+    return _load_evidence(value), True
+
+
+def _cacheable_extraction(extraction: Tuple[List[AbstractEvidence], bool]) -> bool:
+    """Persist only non-empty results from runs in which every agent finished"""
+    evidence_items, complete = extraction
+    return complete and bool(evidence_items)
+
+
+@functools.lru_cache(maxsize=None)
+def _response_format(schema) -> Dict:
+    """Batch API response_format for an evidence model, built once per model"""
+    return {
+        "type": "json_schema",
+        "json_schema": {"name": schema.__name__, "schema": schema.model_json_schema()}
+    }
+
+
+async def _run_openai_batch(requests: List[Dict]) -> Dict[str, str]:
+    """Submit chat/completions requests through the OpenAI Batch API and wait for the results
+
+    Returns a mapping of custom_id -> response message content.
+    """
+    client = AsyncOpenAI()
+
+    payload = b"\n".join(orjson.dumps(request) for request in requests)
+    batch_file = await client.files.create(file=("evidence_batch.jsonl", payload), purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h"
+    )
+
+    while batch.status not in ("completed", "failed", "expired", "cancelled"):
+        await asyncio.sleep(SETTINGS["batch_poll_interval"])
+        batch = await client.batches.retrieve(batch.id)
+
+    if batch.status != "completed":
+        print(f"OpenAI batch {batch.id} ended with status {batch.status}")
+    if not batch.output_file_id:
+        return {}
+
+    output = await client.files.content(batch.output_file_id)
+
+    contents = {}
+    for line in output.text.splitlines():
+        if not line.strip():
+            continue
+        item = orjson.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") != 200:
+            print(f"Batch request {item.get('custom_id')} failed: {item.get('error') or response.get('body')}")
+            continue
+        contents[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"]
+
+    return contents
 
-from ..models.state import AbstractEvidence
-from .agents import VariantEvidenceAgent, FunctionalEvidenceAgent, CohortEvidenceAgent, SegregationEvidenceAgent
 
 class EvidenceExtractionOrchestrator:
     """Orchestrates all evidence extraction agents"""
@@ -17,18 +134,67 @@ class EvidenceExtractionOrchestrator:
             )
         self.tracer = tracer
 
-        self.llm = ChatOpenAI(model="gpt-4o-mini", temperature=0, callbacks=[tracer])
+        self.llm = ChatOpenAI(
+            model=SETTINGS["llm_model"],
+            temperature=SETTINGS["llm_temperature"],
+            callbacks=[tracer]
+        )
 
         self.variant_agent = VariantEvidenceAgent(self.llm)
         self.functional_agent = FunctionalEvidenceAgent(self.llm)
         self.cohort_agent = CohortEvidenceAgent(self.llm)
         self.segregation_agent = SegregationEvidenceAgent(self.llm)
+        self.combined_agent = CombinedEvidenceAgent(self.llm)
+
+        # (pmid, gene, disease) -> future for extractions currently running
+        self._inflight: Dict[Tuple[str, str, str], asyncio.Future] = {}
+
+    def _active_agents(self) -> List:
+        """Agents that run for each abstract under the current settings"""
+        if SETTINGS["combined_extraction"]:
+            return [self.combined_agent]
+        return [self.variant_agent, self.functional_agent, self.cohort_agent, self.segregation_agent]
     
     async def extract_all_evidence(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> List[AbstractEvidence]:
-        """Run all agents in parallel for a single abstract"""
+        """Extract all evidence types for a single abstract
 
+        Concurrent calls for the same (pmid, gene, disease) share one extraction.
+        """
+        key = (pmid, gene, disease)
+        if key in self._inflight:
+            return await self._inflight[key]
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            evidence_items, _ = await self._extract_all_evidence(pmid, abstract_data, gene, disease)
+            future.set_result(evidence_items)
+            return evidence_items
+        finally:
+            if not future.done():
+                future.set_result([])
+            self._inflight.pop(key, None)
+
+    # empty or partial results aren't persisted: they may come from an error that a later run won't hit
+    @cached_async(
+        evidence_cache,
+        key_fn=_evidence_key,
+        dumps=_dump_extraction,
+        loads=_load_extraction,
+        cache_if=_cacheable_extraction
+    )
+    async def _extract_all_evidence(self, pmid: str, abstract_data: Dict, gene: str, disease: str) -> Tuple[List[AbstractEvidence], bool]:
+        """Return the evidence items and whether every agent finished without raising"""
         print(f"Extracting evidence from PMID {pmid}")
+
+        # truncate once and share the result with every agent
+        abstract_data = {**abstract_data, "abstract": truncate_abstract(abstract_data["abstract"], SETTINGS["max_abstract_tokens"])}
+
+        if SETTINGS["combined_extraction"]:
+            # one LLM call returning all four evidence types
+            return await self.combined_agent.analyze(pmid, abstract_data, gene, disease), True
         
+        # otherwise run the four single-type agents in parallel
         tasks = [
             self.variant_agent.analyze(pmid, abstract_data, gene, disease),
             self.functional_agent.analyze(pmid, abstract_data, gene, disease),
@@ -39,12 +205,90 @@ class EvidenceExtractionOrchestrator:
         results = await asyncio.gather(*tasks, return_exceptions=True)
         
         evidence_items = []
+        complete = True
         for result in results:
-            if result and not isinstance(result, Exception):
+            if isinstance(result, Exception):
+                # an agent that ran out of retries; keep the others' evidence for this run
+                print(f"Evidence agent failed for PMID {pmid}: {str(result)}")
+                complete = False
+            elif result:
                 evidence_items.append(result)
         
-        # Remove the pdb.set_trace() line that's causing the debugger to stop
-        # import pdb; pdb.set_trace()
-        
         # print(f"Found {len(evidence_items)} evidence items in PMID {pmid}")
+        return evidence_items, complete
+
+    async def extract_all_evidence_batch(self, abstracts: Dict[str, Dict], gene: str, disease: str) -> List[AbstractEvidence]:
+        """Extract evidence for many abstracts through the OpenAI Batch API
+
+        Responses already in the LLM cache are reused; everything else is sent as one
+        batch job. Responses that validate against the agent's schema are written back
+        to the cache, so a later live run gets cache hits.
+        """
+        agents = {type(agent).__name__: agent for agent in self._active_agents()}
+
+        contents = {}  # custom_id -> response content
+        keys = {}      # custom_id -> LLM cache key
+        requests = []
+        for pmid, abstract_data in abstracts.items():
+            abstract = truncate_abstract(abstract_data["abstract"], SETTINGS["max_abstract_tokens"])
+            for agent_name, agent in agents.items():
+                custom_id = f"{pmid}:{agent_name}"
+                key = cache_key(agent_name, gene, disease, abstract)
+
+                cached = await llm_cache.get(key)
+                if cached is not None:
+                    contents[custom_id] = cached
+                    continue
+
+                keys[custom_id] = key
+                requests.append({
+                    "custom_id": custom_id,
+                    "method": "POST",
+                    "url": "/v1/chat/completions",
+                    "body": {
+                        "model": SETTINGS["llm_model"],
+                        "temperature": SETTINGS["llm_temperature"],
+                        "messages": [{
+                            "role": "user",
+                            "content": render_prompt(agent.prompt, gene, disease, abstract)
+                        }],
+                        "response_format": _response_format(agent.schema)
+                    }
+                })
+
+        if requests:
+            print(f"Submitting {len(requests)} requests to the OpenAI Batch API")
+            contents.update(await _run_openai_batch(requests))
+
+        evidence_items = []
+        for custom_id, content in contents.items():
+            pmid, agent_name = custom_id.split(":", 1)
+            agent = agents[agent_name]
+            if content is None:
+                # the model refused; there is no content to parse
+                print(f"Batch result {custom_id} has no content")
+                continue
+            try:
+                result = agent.schema.model_validate_json(content)
+            except ValidationError as e:
+                print(f"Error parsing batch result {custom_id}: {e}")
+                continue
+
+            # the batch job isn't schema-enforced, so only output that validated is cached;
+            # the live path shares these keys and must never read an entry it can't parse
+            if custom_id in keys:
+                await llm_cache.set(keys[custom_id], result.model_dump_json())
+
+            try:
+                evidence = agent.to_evidence(pmid, result)
+            except Exception as e:
+                print(f"Error converting batch result {custom_id}: {e}")
+                continue
+
+            # the combined agent returns a list, single-type agents return one item or None
+            if isinstance(evidence, list):
+                evidence_items.extend(evidence)
+            elif evidence:
+                evidence_items.append(evidence)
+
         return evidence_items
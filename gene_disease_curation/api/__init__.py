@@ -1,4 +1,4 @@
-from .pubmed import PubMedManager
+from .pubmed import PubMedManager, get_pubmed_manager, close_pubmed_manager
 from .tmvar import TMVarClient
 
-__all__ = ['PubMedManager', 'TMVarClient']
\ No newline at end of file
+__all__ = ['PubMedManager', 'get_pubmed_manager', 'close_pubmed_manager', 'TMVarClient']
\ No newline at end of file
@@ -0,0 +1,21 @@
+import httpx
+
+from ..config import SETTINGS
+
+def make_client() -> httpx.AsyncClient:
+    """Create an async HTTP client with HTTP/2, a keep-alive pool and connect retries"""
+    # pool limits and http2 must be set on the transport; AsyncClient ignores
+    # its own limits/http2 arguments when a transport is passed
+    transport = httpx.AsyncHTTPTransport(
+        retries=3,
+        http2=True,
+        limits=httpx.Limits(max_keepalive_connections=32, max_connections=64)
+    )
+    return httpx.AsyncClient(
+        transport=transport,
+        timeout=httpx.Timeout(30.0, connect=5.0),
+        headers={
+            "Accept-Encoding": "gzip, br",
+            "User-Agent": SETTINGS["http_user_agent"]
+        }
+    )
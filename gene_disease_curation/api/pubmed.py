@@ -1,15 +1,32 @@
-import httpx
 import asyncio
-from typing import List, Dict, Any
-import re
+import weakref
+import orjson
+from typing import List, Dict, Any, AsyncIterator, Optional
 from datetime import datetime
 
+from ..config import SETTINGS
+from .http import make_client
+
+# MEDLINE fields read from efetch records
+MEDLINE_TAGS = {"PMID", "TI", "AB", "DP", "FAU", "AU"}
+
 class PubMedManager:
     """Manages interactions with PubMed API"""
     
     def __init__(self):
         self.base_url = "https://eutils.ncbi.nlm.nih.gov/entrez/eutils"
-        self.client = httpx.AsyncClient(timeout=30.0)
+        # keep-alive pool + HTTP/2 so repeated esearch/efetch calls reuse one connection
+        self.client = make_client()
+        # pmid -> future for abstracts currently being fetched, shared by concurrent callers
+        self._inflight: Dict[str, asyncio.Future] = {}
+    
+    @staticmethod
+    def _eutils_params(params: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the NCBI API key, if configured, to E-utilities query params"""
+        # with a key NCBI allows 10 requests/second instead of 3
+        if SETTINGS["ncbi_api_key"]:
+            params["api_key"] = SETTINGS["ncbi_api_key"]
+        return params
     
     async def search_papers(self, gene: str, disease: str, max_results: int = 30) -> List[str]:
         """Search PubMed for papers about a gene-disease relationship"""
@@ -18,20 +35,20 @@ class PubMedManager:
         
 
         url = f"{self.base_url}/esearch.fcgi"
-        params = {
+        params = self._eutils_params({
             "db": "pubmed",
             "term": query,
             "retmode": "json",
             "retmax": max_results,
             "sort": "relevance"
-        }
+        })
         
         try:
 
             response = await self.client.get(url, params=params)
             response.raise_for_status()
             
-            data = response.json()
+            data = orjson.loads(response.content)
             pmids = data.get("esearchresult", {}).get("idlist", [])
             
             return pmids
@@ -39,67 +56,114 @@ class PubMedManager:
             print(f"Error searching PubMed: {e}")
             return []
     
-    async def fetch_abstracts(self, pmids: List[str]) -> Dict[str, Dict[str, Any]]:
-        """Fetch abstracts for a list of PMIDs"""
-        if not pmids:
-            return {}
+    @staticmethod
+    def _medline_record(fields: Dict[str, List[str]]) -> Optional[Dict[str, Any]]:
+        """Build abstract data from one parsed MEDLINE record, or None if it has no abstract"""
+        pmid = fields.get("PMID", [""])[0]
+        abstract_text = " ".join(fields.get("AB", []))
+        if not pmid or not abstract_text:
+            return None
+        
+        # DP is e.g. "2020 Jan 15"; FAU is "Lastname, Firstname", AU is "Lastname FM"
+        date = fields.get("DP", [""])[0]
+        if fields.get("FAU"):
+            first_author = fields["FAU"][0].split(",")[0]
+        elif fields.get("AU"):
+            first_author = fields["AU"][0].rsplit(" ", 1)[0]
+        else:
+            first_author = ""
         
+        return {
+            "pmid": pmid,
+            "title": " ".join(fields.get("TI", [])) or "Unknown Title",
+            "abstract": abstract_text,
+            "year": int(date[:4]) if date[:4].isdigit() else None,
+            "first_author": first_author or "Unknown"
+        }
+    
+    async def iter_abstracts(self, pmids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Yield abstracts one at a time as the efetch response streams in
+        
+        PMIDs already being fetched by a concurrent call are not requested again;
+        their results are taken from that call once it has them.
+        """
+        loop = asyncio.get_running_loop()
+        waiting = {}  # pmid -> future owned by another caller
+        owned = {}    # pmid -> future this call resolves
+        for pmid in dict.fromkeys(pmids):
+            if pmid in self._inflight:
+                waiting[pmid] = self._inflight[pmid]
+            else:
+                owned[pmid] = self._inflight[pmid] = loop.create_future()
+        
+        try:
+            if owned:
+                async for abstract_data in self._stream_medline(list(owned)):
+                    future = owned.get(abstract_data["pmid"])
+                    if future is not None and not future.done():
+                        future.set_result(abstract_data)
+                    yield abstract_data
+        finally:
+            # PMIDs without an abstract (or a failed fetch) resolve to None
+            for pmid, future in owned.items():
+                if not future.done():
+                    future.set_result(None)
+                self._inflight.pop(pmid, None)
+        
+        for future in waiting.values():
+            abstract_data = await future
+            if abstract_data:
+                yield abstract_data
+    
+    async def _stream_medline(self, pmids: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Run one efetch for pmids and yield each MEDLINE record as it is parsed"""
         url = f"{self.base_url}/efetch.fcgi"
-        params = {
+        params = self._eutils_params({
             "db": "pubmed",
             "id": ",".join(pmids),
-            "retmode": "xml",
-            "rettype": "abstract"
-        }
+            "retmode": "text",
+            "rettype": "medline"
+        })
         
-        try:
-
-            response = await self.client.get(url, params=params)
+        # MEDLINE format: "TAG - value" lines, continuation lines indented by
+        # six spaces, records separated by a blank line
+        fields: Dict[str, List[str]] = {}
+        tag = None
+        async with self.client.stream("GET", url, params=params) as response:
             response.raise_for_status()
-    
-            xml_data = response.text
             
-            abstracts = {}
-            for pmid in pmids:
-                # Find abstract text
-                abstract_match = re.search(
-                    f'<PubmedArticle>.*?<PMID.*?>{pmid}</PMID>.*?<AbstractText>(.*?)</AbstractText>',
-                    xml_data, re.DOTALL
-                )
+            async for line in response.aiter_lines():
+                line = line.rstrip("\r\n")
                 
-                # Find title
-                title_match = re.search(
-                    f'<PubmedArticle>.*?<PMID.*?>{pmid}</PMID>.*?<ArticleTitle>(.*?)</ArticleTitle>',
-                    xml_data, re.DOTALL
-                )
-                
-                # Find year
-                year_match = re.search(
-                    f'<PubmedArticle>.*?<PMID.*?>{pmid}</PMID>.*?<PubDate>.*?<Year>(\\d+)</Year>',
-                    xml_data, re.DOTALL
-                )
-                
-                # Find first author
-                author_match = re.search(
-                    f'<PubmedArticle>.*?<PMID.*?>{pmid}</PMID>.*?<Author.*?>.*?<LastName>(.*?)</LastName>',
-                    xml_data, re.DOTALL
-                )
-                
-                if abstract_match:
-                    abstract_text = abstract_match.group(1)
-                    title = title_match.group(1) if title_match else "Unknown Title"
-                    year = int(year_match.group(1)) if year_match else None
-                    first_author = author_match.group(1) if author_match else "Unknown"
-                    
-                    abstracts[pmid] = {
-                        "pmid": pmid,
-                        "title": title,
-                        "abstract": abstract_text,
-                        "year": year,
-                        "first_author": first_author
-                    }
-            # import pdb; pdb.set_trace()
-            return abstracts
+                if not line.strip():
+                    if fields:
+                        abstract_data = self._medline_record(fields)
+                        if abstract_data:
+                            yield abstract_data
+                    fields = {}
+                    tag = None
+                elif line.startswith("      "):
+                    if tag is not None:
+                        fields[tag][-1] += " " + line.strip()
+                else:
+                    tag = line[:4].rstrip()
+                    if tag in MEDLINE_TAGS:
+                        fields.setdefault(tag, []).append(line[6:].strip())
+                    else:
+                        tag = None
+        
+        if fields:
+            abstract_data = self._medline_record(fields)
+            if abstract_data:
+                yield abstract_data
+    
+    async def fetch_abstracts(self, pmids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Fetch abstracts for a list of PMIDs"""
+        try:
+            return {
+                abstract_data["pmid"]: abstract_data
+                async for abstract_data in self.iter_abstracts(pmids)
+            }
         except Exception as e:
             print(f"Error fetching abstracts: {e}")
             return {}
@@ -107,3 +171,22 @@ class PubMedManager:
     async def close(self):
         """Close the HTTP client"""
         await self.client.aclose()
+
+
+# One manager per event loop: workflow nodes in a run share its connection pool
+# and in-flight futures, but a pooled HTTP/2 client can't be reused by another loop
+_managers: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, PubMedManager]" = weakref.WeakKeyDictionary()
+
+def get_pubmed_manager() -> PubMedManager:
+    """Return the PubMedManager for the running event loop"""
+    loop = asyncio.get_running_loop()
+    manager = _managers.get(loop)
+    if manager is None:
+        manager = _managers[loop] = PubMedManager()
+    return manager
+
+async def close_pubmed_manager():
+    """Close the running event loop's PubMedManager, if one was created"""
+    manager = _managers.pop(asyncio.get_running_loop(), None)
+    if manager is not None:
+        await manager.close()
@@ -1,13 +1,62 @@
-import httpx
 import asyncio
+import bisect
+import orjson
 from typing import List, Dict, Optional
 
+from ..cache import cached_async, mutation_cache
+from .http import make_client
+
+# tmVar accepts at most this many characters per request
+TMVAR_MAX_CHARS = 5000
+# joins texts packed into one tmVar request
+PACK_SEPARATOR = "\n---\n"
+
+def _mutation_key(client, text: str) -> str:
+    return mutation_cache.make_key("tmvar", text[:TMVAR_MAX_CHARS])
+
+def _dump_mutations(mutations: List[Dict]) -> str:
+    return orjson.dumps(mutations).decode("utf-8")
+
 class TMVarClient:
     """Client for the TMVar API for mutation extraction from text"""
     
     def __init__(self):
         self.base_url = "https://www.ncbi.nlm.nih.gov/research/bionlp/RESTful/tmVar.cgi"
-        self.client = httpx.AsyncClient(timeout=30.0)
+        self.client = make_client()
+    
+    async def _annotate(self, text: str) -> List[Dict]:
+        """Send text to tmVar and return its raw denotations; raises on HTTP errors"""
+        params = {
+            "content": text,
+            "format": "json"
+        }
+        
+        response = await self.client.get(self.base_url, params=params)
+        response.raise_for_status()
+        data = orjson.loads(response.content)
+        return data.get("denotations", [])
+    
+    @staticmethod
+    def _to_mutation(item: Dict, text: str, offset: int = 0) -> Dict:
+        """Convert a tmVar denotation into a mutation dict, shifting its span by offset"""
+        start = item["span"]["begin"] - offset
+        end = item["span"]["end"] - offset
+        return {
+            "mutation_id": item.get("id", ""),
+            "type": item.get("obj", "mutation"),
+            "text": text[start:end],
+            "normalized": "",  # TMVar doesn't always provide normalized form
+            "position": {
+                "start": start,
+                "end": end
+            }
+        }
+    
+    @cached_async(mutation_cache, key_fn=_mutation_key, dumps=_dump_mutations, loads=orjson.loads)
+    async def _fetch_mutations(self, text: str) -> List[Dict]:
+        """Extract mutations from one text; results are cached on its content, errors are not"""
+        text = text[:TMVAR_MAX_CHARS]
+        return [self._to_mutation(item, text) for item in await self._annotate(text)]
         
     async def extract_mutations(self, text: str) -> List[Dict]:
         """
@@ -25,45 +74,72 @@ class TMVarClient:
             - position: Character position in text
         """
         try:
-            params = {
-                "content": text[:5000],  # Limit text length
-                "format": "json"
-            }
-            
-            response = await self.client.get(self.base_url, params=params)
-            data = response.json()
-            
-            mutations = []
-            if "denotations" in data:
-                for item in data["denotations"]:
-                    mutation = {
-                        "mutation_id": item.get("id", ""),
-                        "type": item.get("obj", "mutation"),
-                        "text": text[item["span"]["begin"]:item["span"]["end"]],
-                        "normalized": "",  # TMVar doesn't always provide normalized form
-                        "position": {
-                            "start": item["span"]["begin"],
-                            "end": item["span"]["end"]
-                        }
-                    }
-                    mutations.append(mutation)
-            
-            return mutations
+            return await self._fetch_mutations(text)
         except Exception as e:
             print(f"TMVar API error: {str(e)}")
             return []  # Return empty list on error
         
+    async def _extract_packed(self, texts: List[str]) -> List[List[Dict]]:
+        """Send several texts as one tmVar request and split the mutations back per text"""
+        offsets = []
+        position = 0
+        for text in texts:
+            offsets.append(position)
+            position += len(text) + len(PACK_SEPARATOR)
+        
+        results: List[List[Dict]] = [[] for _ in texts]
+        for item in await self._annotate(PACK_SEPARATOR.join(texts)):
+            index = bisect.bisect_right(offsets, item["span"]["begin"]) - 1
+            # drop spans that run past the end of their text into the separator
+            if item["span"]["end"] - offsets[index] > len(texts[index]):
+                continue
+            results[index].append(self._to_mutation(item, texts[index], offsets[index]))
+        
+        for text, mutations in zip(texts, results):
+            await mutation_cache.set(_mutation_key(self, text), _dump_mutations(mutations))
+        return results
+    
     async def batch_extract_mutations(self, texts: List[str]) -> List[List[Dict]]:
-        """Extract mutations from multiple texts in parallel"""
-        tasks = [self.extract_mutations(text) for text in texts]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
+        """
+        Extract mutations from multiple texts in parallel
+        
+        Cached texts are not sent again. The rest are packed into shared
+        requests that each stay within TMVAR_MAX_CHARS, cutting the number of
+        round trips by up to the packing factor.
         
-        # Handle exceptions
-        processed_results = []
-        for result in results:
-            if isinstance(result, Exception):
-                processed_results.append([])
+        Args:
+            texts: The texts to analyze
+            
+        Returns:
+            One list of mutation dictionaries per text, in input order; empty
+            for texts whose request failed
+        """
+        results: List[Optional[List[Dict]]] = [None] * len(texts)
+        groups: List[List[int]] = []
+        group_length = 0
+        for i, text in enumerate(texts):
+            text = text[:TMVAR_MAX_CHARS]
+            cached = await mutation_cache.get(_mutation_key(self, text))
+            if cached is not None:
+                results[i] = orjson.loads(cached)
+                continue
+            
+            if groups and group_length + len(PACK_SEPARATOR) + len(text) <= TMVAR_MAX_CHARS:
+                groups[-1].append(i)
+                group_length += len(PACK_SEPARATOR) + len(text)
             else:
-                processed_results.append(result)
-                
-        return processed_results
+                groups.append([i])
+                group_length = len(text)
+        
+        packed = await asyncio.gather(
+            *(self._extract_packed([texts[i][:TMVAR_MAX_CHARS] for i in group]) for group in groups),
+            return_exceptions=True
+        )
+        for group, group_results in zip(groups, packed):
+            if isinstance(group_results, Exception):
+                print(f"TMVar API error: {str(group_results)}")
+                group_results = [[] for _ in group]
+            for i, mutations in zip(group, group_results):
+                results[i] = mutations
+        
+        return results
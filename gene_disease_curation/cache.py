@@ -0,0 +1,198 @@
+"""
+Content-addressed caches for LLM responses and extracted evidence.
+
+Entries are keyed on a hash of everything that determines the output
+(agent, model, temperature, prompt version, gene, disease, abstract) so
+repeated runs over overlapping PMIDs skip the LLM round-trip entirely,
+including across processes.
+"""
+import asyncio
+import collections
+import functools
+import hashlib
+import os
+import sqlite3
+import threading
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from .config import SETTINGS
+
+# One connection per database file, shared by every cache table stored in it and
+# opened on first use; sqlite3 connections aren't safe to use from two threads at once
+_connections: Dict[str, Optional[sqlite3.Connection]] = {}
+_db_lock = threading.Lock()
+
+
+def _connect(path: str) -> Optional[sqlite3.Connection]:
+    """Return the shared connection to path, opening it on first use; call with _db_lock held"""
+    if path not in _connections:
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            conn = sqlite3.connect(path, check_same_thread=False)
+            # in WAL mode with synchronous=NORMAL a commit doesn't fsync; a crash can lose
+            # the last few entries but never corrupts the file, which is fine for a cache
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+        except sqlite3.Error as e:
+            print(f"Error opening cache database at {path}: {str(e)}")
+            conn = None
+        _connections[path] = conn
+    return _connections[path]
+
+
+class LLMCache:
+    """Get-or-compute cache for LLM responses, persisted in SQLite
+
+    SQLite is read and written on executor threads so lookups don't block the
+    event loop; recently used entries are also kept in a bounded in-memory LRU.
+    """
+
+    table = "llm_cache"
+
+    def __init__(self, path: Optional[str] = None, memory_size: int = 1024):
+        """
+        Initialize the cache; the database is opened on first use
+
+        Args:
+            path: SQLite database file; if None the cache is the in-memory LRU only
+            memory_size: Entries kept in the in-memory LRU
+        """
+        self.path = path
+        self.memory_size = memory_size
+        self._memory: "collections.OrderedDict[str, str]" = collections.OrderedDict()
+        self._table_ready = False
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Build a cache key from the parts that determine an LLM response"""
+        digest = hashlib.blake2b(digest_size=16)
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x1f")  # unit separator so ("ab", "c") != ("a", "bc")
+        return digest.hexdigest()
+
+    def _remember(self, key: str, value: str) -> None:
+        """Put an entry in the in-memory LRU, evicting the least recently used"""
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        if len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Shared connection with this cache's table created; call with _db_lock held"""
+        conn = _connect(self.path)
+        if conn is not None and not self._table_ready:
+            try:
+                conn.execute(
+                    f"CREATE TABLE IF NOT EXISTS {self.table} (key TEXT PRIMARY KEY, value TEXT NOT NULL)"
+                )
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error creating {self.table}: {str(e)}")
+                return None
+            self._table_ready = True
+        return conn
+
+    def _read(self, key: str) -> Optional[str]:
+        """Read key from SQLite; runs on an executor thread"""
+        with _db_lock:
+            conn = self._db()
+            if conn is None:
+                return None
+            try:
+                row = conn.execute(f"SELECT value FROM {self.table} WHERE key = ?", (key,)).fetchone()
+            except sqlite3.Error as e:
+                print(f"Error reading {self.table}: {str(e)}")
+                return None
+        return row[0] if row is not None else None
+
+    def _write(self, key: str, value: str) -> None:
+        """Write key to SQLite; runs on an executor thread"""
+        with _db_lock:
+            conn = self._db()
+            if conn is None:
+                return
+            try:
+                conn.execute(f"INSERT OR REPLACE INTO {self.table} (key, value) VALUES (?, ?)", (key, value))
+                conn.commit()
+            except sqlite3.Error as e:
+                print(f"Error writing {self.table}: {str(e)}")
+
+    async def get(self, key: str) -> Optional[str]:
+        """Return the cached value for key, or None on a miss"""
+        if key in self._memory:
+            self._memory.move_to_end(key)
+            return self._memory[key]
+
+        if not self.path:
+            return None
+        value = await asyncio.get_running_loop().run_in_executor(None, self._read, key)
+        if value is not None:
+            self._remember(key, value)
+        return value
+
+    async def set(self, key: str, value: str) -> None:
+        """Store value under key"""
+        self._remember(key, value)
+        if self.path:
+            await asyncio.get_running_loop().run_in_executor(None, self._write, key, value)
+
+    async def get_or_compute(self, key: str, compute: Callable[[], Awaitable[str]]) -> str:
+        """Return the cached value for key, computing and storing it on a miss"""
+        value = await self.get(key)
+        if value is not None:
+            return value
+
+        value = await compute()
+        await self.set(key, value)
+        return value
+
+
+class AbstractEvidenceCache(LLMCache):
+    """Cache of the final evidence items extracted from an abstract"""
+
+    table = "abstract_evidence"
+
+
+class MutationCache(LLMCache):
+    """Cache of tmVar mutation annotations, keyed on the text sent to the API"""
+
+    table = "tmvar_mutations"
+
+
+def cached_async(
+    cache: LLMCache,
+    key_fn: Callable[..., str],
+    dumps: Callable[[Any], str],
+    loads: Callable[[str], Any],
+    cache_if: Callable[[Any], bool] = lambda result: True
+):
+    """
+    Cache the results of an async function
+
+    Args:
+        cache: Cache to store results in
+        key_fn: Builds the cache key from the function's arguments
+        dumps: Serializes a result to a string
+        loads: Restores a result from its serialized string
+        cache_if: Results for which this returns False are not stored
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_fn(*args, **kwargs)
+            cached = await cache.get(key)
+            if cached is not None:
+                return loads(cached)
+
+            result = await func(*args, **kwargs)
+            if cache_if(result):
+                await cache.set(key, dumps(result))
+            return result
+        return wrapper
+    return decorator
+
+
+llm_cache = LLMCache(SETTINGS["llm_cache_path"])
+evidence_cache = AbstractEvidenceCache(SETTINGS["llm_cache_path"])
+mutation_cache = MutationCache(SETTINGS["llm_cache_path"])
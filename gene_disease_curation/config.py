@@ -1,5 +1,8 @@
 import os
+import asyncio
 import getpass
+import weakref
+from enum import Enum
 
 def setup_environment():
     """Set up environment variables for LangChain and LangSmith"""
@@ -12,11 +15,39 @@ def setup_environment():
     
     os.environ["LANGCHAIN_PROJECT"] = "gene-disease-curation"
 
+class ExtractionMode(str, Enum):
+    LIVE = "live"    # async chat/completions calls, results within the run
+    BATCH = "batch"  # OpenAI Batch API: cheaper, no TPM throttling, up to 24h turnaround
+
 # Configuration settings
 SETTINGS = {
-    "batch_size": 5,
+    "max_in_flight": 10,  # PMIDs being extracted at once
+    "llm_concurrency": 8,  # LLM requests in flight at once, across all PMIDs and agents
     "max_abstracts": 30,
     "llm_model": "gpt-4o-mini",
     "llm_temperature": 0,
-    "max_abstract_length": 1500
-}
\ No newline at end of file
+    "max_abstract_tokens": 400,  # abstracts are cut to this many tokens before prompting
+    "keep_raw_evidence": False,  # store the full parsed LLM output in AbstractEvidence.raw_data
+    # extract all four evidence types with one LLM call per abstract instead of four
+    "combined_extraction": True,
+    "extraction_mode": ExtractionMode(os.environ.get("EXTRACTION_MODE", ExtractionMode.LIVE.value)),
+    "batch_poll_interval": 30.0,  # seconds between Batch API status checks
+    # SQLite file for cached LLM responses; set LLM_CACHE_PATH="" to keep the cache in memory only
+    "llm_cache_path": os.environ.get("LLM_CACHE_PATH", ".cache/llm_responses.sqlite") or None,
+    # NCBI E-utilities key: raises the rate limit from 3 to 10 requests/second
+    "ncbi_api_key": os.environ.get("NCBI_API_KEY") or None,
+    "http_user_agent": "gene-disease-curation/1.0",
+    "embed_batch_size": int(os.environ.get("EMBED_BATCH", "128"))  # texts per embedding forward pass
+}
+
+# One semaphore per event loop: asyncio primitives are bound to the loop that
+# first uses them, so a module-level one breaks on the second asyncio.run
+_llm_semaphores: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+def llm_semaphore() -> asyncio.Semaphore:
+    """Return the semaphore capping concurrent LLM requests in the running event loop"""
+    loop = asyncio.get_running_loop()
+    semaphore = _llm_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _llm_semaphores[loop] = asyncio.Semaphore(SETTINGS["llm_concurrency"])
+    return semaphore
@@ -2,6 +2,7 @@ from .nodes import (
     search_literature,
     fetch_abstracts,
     extract_evidence,
+    fetch_and_extract,
     calculate_scores,
     classify_relationship
 )
@@ -12,6 +13,7 @@ __all__ = [
     'search_literature',
     'fetch_abstracts',
     'extract_evidence',
+    'fetch_and_extract',
     'calculate_scores',
     'classify_relationship',
     'build_curation_graph'
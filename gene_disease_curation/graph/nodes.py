@@ -1,35 +1,63 @@
 import asyncio
+import functools
+import weakref
 from typing import Dict, List, Any, Optional
 import httpx
 from datetime import datetime
-import re
 from collections import defaultdict
+import numpy as np
 
 from langchain_openai import ChatOpenAI
 from langchain.callbacks.tracers import LangChainTracer
 from langsmith import trace
 
-from ..models.state import CurationState, AbstractEvidence, EvidenceType, EvidenceLevel
+from ..models.state import CurationState, AbstractEvidence, EvidenceType, EvidenceLevel, ScoreIdx
 # Remove the import of get_tracer
-from ..config import SETTINGS
+from ..config import SETTINGS, ExtractionMode
 from ..agents.orchestrator import EvidenceExtractionOrchestrator
 from ..api.tmvar import TMVarClient
-from ..api.pubmed import PubMedManager
+from ..api.pubmed import get_pubmed_manager
 from ..ner.entity_extractor import BiomedicalNER
 from ..vector_db.embeddings import EmbeddingModel
 from ..vector_db.document_store import VectorDocumentStore
 
-ner_model = BiomedicalNER()
-embedding_model = EmbeddingModel()
-document_store = VectorDocumentStore(embedding_model=embedding_model)
+# evidence types in ScoreIdx order, with their weights in the total score
+SCORED_TYPES = [EvidenceType.VARIANT, EvidenceType.FUNCTIONAL, EvidenceType.SEGREGATION, EvidenceType.COHORT]
+TYPE_WEIGHTS = np.array([1.0, 0.8, 1.2, 1.5], dtype=np.float32)
+
 tmvar_client = TMVarClient()
 
+# The models are built on first use rather than at import, so run_curation can set
+# USE_SIMPLE_NER and warm the loader caches (utils.loaders) before they are constructed
+@functools.lru_cache(maxsize=1)
+def get_ner_model() -> BiomedicalNER:
+    """Return the shared NER model"""
+    return BiomedicalNER()
+
+@functools.lru_cache(maxsize=1)
+def get_embedding_model() -> EmbeddingModel:
+    """Return the shared embedding model"""
+    return EmbeddingModel()
+
+@functools.lru_cache(maxsize=1)
+def get_document_store() -> VectorDocumentStore:
+    """Return the shared vector document store"""
+    return VectorDocumentStore(embedding_model=get_embedding_model())
+
+# created on first use so importing the graph doesn't build an LLM client; one per
+# event loop (its async OpenAI clients can't cross loops) and per tracer
+_orchestrators: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, Dict]" = weakref.WeakKeyDictionary()
+
+def get_orchestrator(tracer: Optional[LangChainTracer] = None) -> EvidenceExtractionOrchestrator:
+    """Return the evidence extraction orchestrator for the running event loop and tracer"""
+    orchestrators = _orchestrators.setdefault(asyncio.get_running_loop(), {})
+    if tracer not in orchestrators:
+        orchestrators[tracer] = EvidenceExtractionOrchestrator(tracer=tracer)
+    return orchestrators[tracer]
+
 async def search_literature(state: CurationState) -> Dict:
     """Search PubMed for relevant papers"""
-    # remove the tracer.new_trace code that's causing the error
-    pubmed = PubMedManager()
-    
-    pmids = await pubmed.search_papers(state["gene"], state["disease"])
+    pmids = await get_pubmed_manager().search_papers(state["gene"], state["disease"])
     
     if not pmids:
         return {
@@ -53,58 +81,57 @@ async def fetch_abstracts(state: CurationState, tracer: Optional[LangChainTracer
             project_name="gene-disease-curation"
         )
     
-    # remove the tracer.new_trace code
-    pubmed = PubMedManager()
-    
-    abstracts = await pubmed.fetch_abstracts(state["pmids"])
+    abstracts = await get_pubmed_manager().fetch_abstracts(state["pmids"])
     
-    # extract metadata
+    result = {
+        **_abstract_metadata(abstracts),
+        "current_stage": "extract_evidence",
+        "messages": [f"Fetched {len(abstracts)} abstracts"]
+    }
+    return result
+
+def _abstract_metadata(abstracts: Dict[str, Dict]) -> Dict:
+    """State fields derived from the fetched abstracts"""
     years = [a["year"] for a in abstracts.values() if a.get("year")]
     authors = set(a["first_author"] for a in abstracts.values() if a.get("first_author"))
     
-    result = {
+    return {
         "abstracts": abstracts,
         "abstracts_analyzed": len(abstracts),
         "publication_years": sorted(years) if years else [],
-        "independent_groups": len(authors),
-        "current_stage": "extract_evidence",
-        "messages": [f"Fetched {len(abstracts)} abstracts"]
+        "independent_groups": len(authors)
     }
-    return result
 
 async def extract_evidence(state: CurationState, tracer: Optional[LangChainTracer] = None) -> Dict:
     """Extract evidence from all abstracts using parallel agents"""
-    # use provided tracer or create a new one
-    if tracer is None:
-        tracer = LangChainTracer(
-            project_name="gene-disease-curation"
-        )
-    
-    # remove the tracer.new_trace code
-    orchestrator = EvidenceExtractionOrchestrator(tracer=tracer)
+    # the orchestrator creates its own tracer when none is provided
+    orchestrator = get_orchestrator(tracer)
     
     all_evidence = []
-    
-    batch_size = 5
-    pmids = list(state["abstracts"].keys())
-    
-    for i in range(0, len(pmids), batch_size):
-        batch = pmids[i:i+batch_size]
-        
-        # create tasks for this batch
-        tasks = []
-        for pmid in batch:
-            abstract_data = state["abstracts"][pmid]
-            task = orchestrator.extract_all_evidence(
-                pmid, abstract_data, state["gene"], state["disease"]
-            )
-            tasks.append(task)
+
+    if SETTINGS["extraction_mode"] == ExtractionMode.BATCH:
+        # offline run: one Batch API job instead of live requests
+        all_evidence = await orchestrator.extract_all_evidence_batch(
+            state["abstracts"], state["gene"], state["disease"]
+        )
+    else:
+        # rolling window: a new PMID starts as soon as any in-flight one finishes
+        in_flight = asyncio.Semaphore(SETTINGS["max_in_flight"])
         
-        # parallel
-        batch_results = await asyncio.gather(*tasks)
+        async def run(pmid: str) -> List[AbstractEvidence]:
+            async with in_flight:
+                try:
+                    return await orchestrator.extract_all_evidence(
+                        pmid, state["abstracts"][pmid], state["gene"], state["disease"]
+                    )
+                except Exception as e:
+                    # retries exhausted (e.g. persistent rate limiting)
+                    print(f"Error extracting evidence from PMID {pmid}: {e}")
+                    return []
         
-        for evidence_list in batch_results:
-            all_evidence.extend(evidence_list)
+        tasks = [asyncio.create_task(run(pmid)) for pmid in state["abstracts"]]
+        for task in asyncio.as_completed(tasks):
+            all_evidence.extend(await task)
     
     result = {
         "evidence_items": all_evidence,
@@ -113,6 +140,57 @@ async def extract_evidence(state: CurationState, tracer: Optional[LangChainTrace
     }
     return result
 
+async def fetch_and_extract(state: CurationState, tracer: Optional[LangChainTracer] = None) -> Dict:
+    """Fetch abstracts and extract evidence, starting extraction as soon as each abstract arrives"""
+    orchestrator = get_orchestrator(tracer)
+    gene, disease = state["gene"], state["disease"]
+    
+    if SETTINGS["extraction_mode"] == ExtractionMode.BATCH:
+        # the Batch API needs every abstract up front, so there is nothing to overlap
+        abstracts = await get_pubmed_manager().fetch_abstracts(state["pmids"])
+        all_evidence = await orchestrator.extract_all_evidence_batch(abstracts, gene, disease)
+    else:
+        abstracts = {}
+        all_evidence = []
+        num_workers = SETTINGS["max_in_flight"]
+        queue = asyncio.Queue(maxsize=num_workers * 2)  # backpressure on the fetch side
+        
+        async def produce():
+            try:
+                async for abstract_data in get_pubmed_manager().iter_abstracts(state["pmids"]):
+                    abstracts[abstract_data["pmid"]] = abstract_data
+                    await queue.put(abstract_data)
+            except Exception as e:
+                print(f"Error fetching abstracts: {e}")
+            finally:
+                # one sentinel per worker
+                for _ in range(num_workers):
+                    await queue.put(None)
+        
+        async def consume():
+            while True:
+                abstract_data = await queue.get()
+                if abstract_data is None:
+                    return
+                try:
+                    all_evidence.extend(await orchestrator.extract_all_evidence(
+                        abstract_data["pmid"], abstract_data, gene, disease
+                    ))
+                except Exception as e:
+                    print(f"Error extracting evidence from PMID {abstract_data['pmid']}: {e}")
+        
+        await asyncio.gather(produce(), *(consume() for _ in range(num_workers)))
+    
+    return {
+        **_abstract_metadata(abstracts),
+        "evidence_items": all_evidence,
+        "current_stage": "calculate_scores",
+        "messages": [
+            f"Fetched {len(abstracts)} abstracts",
+            f"Extracted {len(all_evidence)} evidence items"
+        ]
+    }
+
 async def calculate_scores(state: CurationState) -> Dict:
     """Calculate scores for each evidence type"""
     evidence_items = state["evidence_items"]
@@ -128,26 +206,14 @@ async def calculate_scores(state: CurationState) -> Dict:
             
         evidence_by_type[evidence_type].append(evidence)
     
-    # calculate scores for each type
-    variant_score = _calculate_type_score(evidence_by_type[EvidenceType.VARIANT])
-    functional_score = _calculate_type_score(evidence_by_type[EvidenceType.FUNCTIONAL])
-    segregation_score = _calculate_type_score(evidence_by_type[EvidenceType.SEGREGATION])
-    cohort_score = _calculate_type_score(evidence_by_type[EvidenceType.COHORT])
-    
-    # calculate total score with weights
-    weights = {
-        EvidenceType.VARIANT: 1.0,
-        EvidenceType.FUNCTIONAL: 0.8,
-        EvidenceType.SEGREGATION: 1.2,
-        EvidenceType.COHORT: 1.5
-    }
-    
-    total_score = (
-        variant_score * weights[EvidenceType.VARIANT] +
-        functional_score * weights[EvidenceType.FUNCTIONAL] +
-        segregation_score * weights[EvidenceType.SEGREGATION] +
-        cohort_score * weights[EvidenceType.COHORT]
-    )
+    # calculate scores for each type, then the weighted total; the array is
+    # converted back to a list because checkpointers serialize state
+    scores = np.array(state["scores"], dtype=np.float32)
+    scores[:ScoreIdx.TOTAL] = [
+        _calculate_type_score(evidence_by_type[evidence_type]) for evidence_type in SCORED_TYPES
+    ]
+    scores[ScoreIdx.TOTAL] = np.dot(TYPE_WEIGHTS, scores[:ScoreIdx.TOTAL])
+    total_score = float(scores[ScoreIdx.TOTAL])
     
     # number of independent research groups?
     pmids = set()
@@ -160,11 +226,7 @@ async def calculate_scores(state: CurationState) -> Dict:
     independent_groups = min(len(pmids), 10)  # Cap at 10
     
     return {
-        "variant_score": variant_score,
-        "functional_score": functional_score,
-        "segregation_score": segregation_score,
-        "cohort_score": cohort_score,
-        "total_score": total_score,
+        "scores": scores.tolist(),
         "independent_groups": independent_groups,
         "current_stage": "classify_relationship",
         "messages": state["messages"] + [f"Total evidence score: {total_score:.2f}"]
@@ -211,7 +273,7 @@ def _calculate_type_score(evidence_list: List[AbstractEvidence]) -> float:
 
 async def classify_relationship(state: CurationState) -> Dict:
     """Classify the gene-disease relationship"""
-    total_score = state["total_score"]
+    total_score = float(state["scores"][ScoreIdx.TOTAL])
     
     thresholds = {
         "definitive": 30.0,
@@ -245,9 +307,12 @@ async def classify_relationship(state: CurationState) -> Dict:
         year_span = max(state["publication_years"]) - min(state["publication_years"])
         confidence_level *= (1 - (year_span / 100))  # Decrease confidence for older studies
     
+    scores = list(state["scores"])
+    scores[ScoreIdx.CONFIDENCE] = confidence_level
+    
     return {
         "classification_suggestion": classification,
-        "confidence_level": confidence_level,
+        "scores": scores,
         "current_stage": "complete",
         "messages": state["messages"] + [f"Classification: {classification} with confidence {confidence_level:.2f}"]
     }
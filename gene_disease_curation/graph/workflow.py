@@ -4,8 +4,7 @@ from langgraph.checkpoint.memory import MemorySaver
 from ..models.state import CurationState
 from .nodes import (
     search_literature,
-    fetch_abstracts,
-    extract_evidence,
+    fetch_and_extract,
     calculate_scores,
     classify_relationship
 )
@@ -15,14 +14,13 @@ def build_curation_graph():
     workflow = StateGraph(CurationState)
     
     workflow.add_node("search", search_literature)
-    workflow.add_node("fetch", fetch_abstracts)
-    workflow.add_node("extract", extract_evidence)
+    # fetching and extraction share one node so LLM calls overlap the efetch download
+    workflow.add_node("fetch_extract", fetch_and_extract)
     workflow.add_node("score", calculate_scores)
     workflow.add_node("classify", classify_relationship)
     
-    workflow.add_edge("search", "fetch")
-    workflow.add_edge("fetch", "extract")
-    workflow.add_edge("extract", "score")
+    workflow.add_edge("search", "fetch_extract")
+    workflow.add_edge("fetch_extract", "score")
     workflow.add_edge("score", "classify")
     workflow.add_edge("classify", END)
     
@@ -52,4 +52,10 @@ class SegregationEvidence(BaseModel):
     inheritance_pattern: Optional[str] = None
     segregation_confirmed: bool = False
     description: str
-    confidence: float
\ No newline at end of file
+    confidence: float
+
+class CombinedEvidence(BaseModel):
+    variant: Optional[VariantEvidence] = Field(None, description="Variant evidence, if any")
+    functional: Optional[FunctionalEvidence] = Field(None, description="Functional evidence, if any")
+    cohort: Optional[CohortEvidence] = Field(None, description="Cohort evidence, if any")
+    segregation: Optional[SegregationEvidence] = Field(None, description="Segregation evidence, if any")
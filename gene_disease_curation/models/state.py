@@ -1,7 +1,17 @@
-from typing import Dict, List, TypedDict, Annotated
+from typing import Dict, List, Optional, TypedDict, Annotated
+from enum import IntEnum
 import operator
 from .evidence import EvidenceType, EvidenceLevel
 
+class ScoreIdx(IntEnum):
+    """Positions in CurationState["scores"]; the four evidence types come first"""
+    VARIANT = 0
+    FUNCTIONAL = 1
+    SEGREGATION = 2
+    COHORT = 3
+    TOTAL = 4
+    CONFIDENCE = 5
+
 class AbstractEvidence(TypedDict):
     pmid: str
     evidence_type: EvidenceType
@@ -10,7 +20,7 @@ class AbstractEvidence(TypedDict):
     confidence: float
     extracted_by: str
     key_terms: List[str]
-    raw_data: Dict  
+    raw_data: Optional[Dict]  # None unless SETTINGS["keep_raw_evidence"]
 
 class CurationState(TypedDict):
 
@@ -21,18 +31,13 @@ class CurationState(TypedDict):
     abstracts: Dict[str, Dict]  # pmid -> abstract data
     evidence_items: Annotated[List[AbstractEvidence], operator.add]
 
-    variant_score: float
-    functional_score: float
-    segregation_score: float
-    cohort_score: float
-    total_score: float
+    scores: List[float]  # len(ScoreIdx), indexed by ScoreIdx; plain floats so checkpoints serialize
 
     publication_years: List[int]
     independent_groups: int
     abstracts_analyzed: int
 
     classification_suggestion: str
-    confidence_level: float
     
     current_stage: str
     errors: List[str]
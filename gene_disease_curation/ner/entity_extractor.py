@@ -1,14 +1,43 @@
-from typing import List, Dict, Any
-import spacy
-from transformers import pipeline
+from typing import List, Dict, Any, Iterable, Iterator, Optional
+import torch
+from transformers import AutoModelForTokenClassification, AutoTokenizer
 import re
 import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from operator import itemgetter
+
+from ..utils.loaders import load_spacy_ner, spacy_gpu_active
+
+# Optional DFA regex engines: Hyperscan scans all patterns in one pass,
+# RE2 avoids backtracking; plain re is the fallback
+try:
+    import hyperscan
+except ImportError:
+    hyperscan = None
+
+try:
+    import re2 as regex_engine
+except ImportError:
+    regex_engine = re
+
+# Optional Aho-Corasick automaton for matching a known gene symbol list
+try:
+    import ahocorasick
+except ImportError:
+    ahocorasick = None
 
 class SimpleEntityExtractor:
     """Simple entity extractor using regex patterns"""
     
-    def __init__(self):
-        """Initialize the extractor with regex patterns"""
+    def __init__(self, gene_symbols: Optional[Iterable[str]] = None):
+        """
+        Initialize the extractor with regex patterns
+        
+        Args:
+            gene_symbols: Known gene symbols (e.g. HGNC); when given, genes are
+                matched exactly against this list instead of the gene regexes
+        """
         self.patterns = {
             "gene": [
                 r'\b[A-Z][A-Z0-9]{1,5}\b',  # Gene symbols like BRCA1, TP53
@@ -29,14 +58,105 @@ class SimpleEntityExtractor:
                 r'\b[A-Z][a-z]+ate\b'       # Chemicals ending in -ate
             ]
         }
+        
+        # Materialize once: a generator would be exhausted by the first use and is always truthy
+        if gene_symbols is not None:
+            gene_symbols = frozenset(gene_symbols)
+        
+        self.gene_matcher = None
+        scan_patterns = self.patterns
+        if gene_symbols:
+            self.gene_matcher = self._build_gene_matcher(gene_symbols)
+            scan_patterns = {
+                entity_type: patterns for entity_type, patterns in self.patterns.items()
+                if entity_type != "gene"
+            }
+        
+        if hyperscan is not None:
+            # One database over every pattern, so the whole text is a single scan
+            expressions = [pattern for patterns in scan_patterns.values() for pattern in patterns]
+            self.pattern_types = [
+                entity_type for entity_type, patterns in scan_patterns.items() for _ in patterns
+            ]
+            # UTF8 | UCP give \b and \w the same Unicode meaning they have in re
+            flags = hyperscan.HS_FLAG_SOM_LEFTMOST | hyperscan.HS_FLAG_UTF8 | hyperscan.HS_FLAG_UCP
+            self.database = hyperscan.Database()
+            self.database.compile(
+                expressions=[pattern.encode() for pattern in expressions],
+                ids=list(range(len(expressions))),
+                elements=len(expressions),
+                flags=[flags] * len(expressions)
+            )
+        else:
+            # One compiled alternation per entity type, so each type is a single pass over the text
+            self.database = None
+            self.compiled = {
+                entity_type: regex_engine.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+                for entity_type, patterns in scan_patterns.items()
+            }
     
-    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
-        """Extract entities from text using regex patterns"""
+    @staticmethod
+    def _build_gene_matcher(gene_symbols: Iterable[str]):
+        """Build an Aho-Corasick automaton over the gene symbols, or a regex if pyahocorasick is missing"""
+        symbols = sorted(frozenset(gene_symbols), key=len, reverse=True)
+        if ahocorasick is not None:
+            automaton = ahocorasick.Automaton()
+            for symbol in symbols:
+                automaton.add_word(symbol, symbol)
+            automaton.make_automaton()
+            return automaton
+        
+        # longest symbols first so e.g. BRCA1 wins over BRCA at the same position
+        return re.compile(
+            r"(?<![A-Za-z0-9])(?:" + "|".join(map(re.escape, symbols)) + r")(?![A-Za-z0-9])"
+        )
+    
+    def _match_genes(self, text: str) -> List[Dict[str, Any]]:
+        """Find whole-word occurrences of the known gene symbols, leftmost-longest like the regex"""
+        if ahocorasick is None:
+            spans = [(match.start(), match.end()) for match in self.gene_matcher.finditer(text)]
+        else:
+            def is_word_char(char):
+                # the same [A-Za-z0-9] boundary as the regex fallback
+                return char.isascii() and char.isalnum()
+            
+            # the automaton reports every symbol ending at each position, inside words and
+            # overlapping (HLA and HLA-B); keep whole tokens, then the longest match at the
+            # leftmost start, skipping matches that overlap one already kept
+            spans = []
+            covered = 0
+            candidates = sorted(
+                ((end - len(symbol) + 1, end + 1) for end, symbol in self.gene_matcher.iter(text)),
+                key=lambda span: (span[0], -span[1])
+            )
+            for start, end in candidates:
+                if start < covered:
+                    continue
+                if (start > 0 and is_word_char(text[start - 1])) or (end < len(text) and is_word_char(text[end])):
+                    continue
+                spans.append((start, end))
+                covered = end
+        
         entities = []
+        for start, end in spans:
+            entities.append({
+                "text": text[start:end],
+                "start": start,
+                "end": end,
+                "type": "gene",
+                "confidence": 1.0  # exact match against the symbol list
+            })
         
-        for entity_type, patterns in self.patterns.items():
-            for pattern in patterns:
-                for match in re.finditer(pattern, text):
+        return entities
+    
+    def extract_entities(self, text: str) -> List[Dict[str, Any]]:
+        """Extract entities from text using regex patterns"""
+        if self.database is not None:
+            entities = self._scan_hyperscan(text)
+        else:
+            entities = []
+            for entity_type, regex in self.compiled.items():
+                for match in regex.finditer(text):
                     entities.append({
                         "text": match.group(0),
                         "start": match.start(),
@@ -45,38 +165,89 @@ class SimpleEntityExtractor:
                         "confidence": 0.8  # Fixed confidence
                     })
         
+        if self.gene_matcher is not None:
+            entities.extend(self._match_genes(text))
+        
         # Sort by position
-        entities.sort(key=lambda x: x["start"])
+        entities.sort(key=itemgetter("start"))
+        
+        return entities
+    
+    def _scan_hyperscan(self, text: str) -> List[Dict[str, Any]]:
+        """
+        Scan text with the Hyperscan database in one pass over all patterns
+        
+        Hyperscan reports every match, including ones that overlap; per entity
+        type the leftmost-longest non-overlapping matches are kept, which is
+        what finditer over the regex alternation returns.
+        """
+        data = text.encode("utf-8")
+        spans = []
+        
+        def on_match(pattern_id, start, end, flags, context):
+            spans.append((self.pattern_types[pattern_id], start, end))
+        
+        self.database.scan(data, match_event_handler=on_match)
+        
+        # Hyperscan reports byte offsets; for non-ASCII text map them to
+        # character offsets with a table built once per text
+        char_offsets = None
+        if len(data) != len(text):
+            char_offsets = []
+            for index, char in enumerate(text):
+                char_offsets.extend([index] * len(char.encode("utf-8")))
+            char_offsets.append(len(text))
+        
+        entities = []
+        type_ends: Dict[str, int] = {}
+        for entity_type, start, end in sorted(set(spans), key=lambda span: (span[1], -span[2])):
+            if start < type_ends.get(entity_type, 0):
+                continue  # overlaps an earlier match of the same type
+            type_ends[entity_type] = end
+            if char_offsets is not None:
+                start, end = char_offsets[start], char_offsets[end]
+            entities.append({
+                "text": text[start:end],
+                "start": start,
+                "end": end,
+                "type": entity_type,
+                "confidence": 0.8  # Fixed confidence
+            })
         
         return entities
 
 class BiomedicalNER:
     """Named Entity Recognition for biomedical text"""
     
-    def __init__(self, model_name="dmis-lab/biobert-base-cased-v1.1", use_simple=None):
-        """Initialize the NER model"""
+    def __init__(self, model_name="dmis-lab/biobert-base-cased-v1.1", use_simple=None, gene_symbols=None):
+        """Initialize the NER model; gene_symbols is passed to the regex extractor"""
         # Check if USE_SIMPLE_NER environment variable is set
         if use_simple is None:
             use_simple = os.environ.get("USE_SIMPLE_NER", "").lower() in ("true", "1", "yes")
         
+        self.model_name = model_name
         self.use_simple = use_simple
+        # frozenset so an iterator can be reused here and pickled to worker processes
+        self.gene_symbols = frozenset(gene_symbols) if gene_symbols is not None else None
         
         if self.use_simple:
             # Use the simple regex-based extractor
-            self.simple_extractor = SimpleEntityExtractor()
+            self.simple_extractor = SimpleEntityExtractor(self.gene_symbols)
             print("Using SimpleEntityExtractor for NER (regex-based)")
         else:
-            try:
-                # Try to load spaCy model first (faster)
-                self.nlp = spacy.load("en_core_sci_md")
-                self.use_spacy = True
+            # Prefer the spaCy model (faster) when it is installed
+            self.nlp = load_spacy_ner()
+            self.use_spacy = self.nlp is not None
+            if self.use_spacy:
                 print("Using spaCy model for NER")
-            except:
-                # Fall back to transformers pipeline
+            else:
+                # Fall back to a transformers token classification model
                 print(f"Loading transformer model {model_name} for NER...")
-                self.ner = pipeline("ner", model=model_name)
+                self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+                self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+                self.model = AutoModelForTokenClassification.from_pretrained(model_name).to(self.device).eval()
                 self.use_spacy = False
-                print("Using transformers pipeline for NER")
+                print("Using transformers model for NER")
         
         # Entity categories of interest
         self.categories = {
@@ -98,9 +269,94 @@ class BiomedicalNER:
         else:
             return self._extract_with_transformers(text)
     
+    def extract_entities_batch(
+        self,
+        texts: List[str],
+        batch_size: int = 64,
+        n_process: int = 1
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Extract biomedical entities from many texts at once
+        
+        spaCy streams the texts through nlp.pipe and the transformers model
+        runs the token windows of all texts in padded forward passes.
+        
+        Args:
+            texts: Texts to analyze
+            batch_size: Texts per spaCy batch, or token windows per transformers forward pass
+            n_process: spaCy worker processes; only worth raising for large batches
+            
+        Returns:
+            One list of entities per text, in input order
+        """
+        if self.use_simple:
+            return [self.simple_extractor.extract_entities(text) for text in texts]
+        elif self.use_spacy:
+            return list(self.stream_spacy(texts, batch_size=batch_size, n_process=n_process))
+        else:
+            return self._extract_batch_with_transformers(texts, batch_size=batch_size)
+    
+    def stream_spacy(
+        self,
+        texts: Iterable[str],
+        batch_size: int = 50,
+        n_process: int = 1
+    ) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Yield each text's spaCy entities as nlp.pipe produces them
+        
+        Args:
+            texts: Texts to analyze, consumed lazily
+            batch_size: Texts per spaCy batch
+            n_process: spaCy worker processes; -1 uses every core. Ignored on the
+                GPU, where forked workers can't reuse the parent's CUDA context
+            
+        Yields:
+            List of entities for each text, in input order
+        """
+        if n_process != 1 and spacy_gpu_active():
+            n_process = 1
+        
+        # the pipeline is loaded with only the components NER needs (see load_spacy_ner)
+        for doc in self.nlp.pipe(texts, batch_size=batch_size, n_process=n_process):
+            yield self._spacy_entities(doc)
+    
+    def extract_entities_parallel(self, texts: List[str], workers: int = 4) -> List[List[Dict[str, Any]]]:
+        """
+        Extract biomedical entities from many texts across worker processes
+        
+        Each process builds its own BiomedicalNER once, so models are never
+        pickled. The transformers model already runs outside the GIL in torch,
+        so that path uses threads sharing this instance instead.
+        
+        Args:
+            texts: Texts to analyze
+            workers: Number of worker processes (or threads)
+            
+        Returns:
+            One list of entities per text, in input order
+        """
+        if not self.use_simple and not self.use_spacy:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                return list(executor.map(self.extract_entities, texts))
+        
+        if self.use_spacy and spacy_gpu_active():
+            # a GPU pipeline batches on the device instead; CUDA doesn't survive fork
+            return self.extract_entities_batch(texts)
+        
+        with multiprocessing.Pool(
+            workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, self.use_simple, self.gene_symbols)
+        ) as pool:
+            return pool.map(_extract_in_worker, texts, chunksize=8)
+    
     def _extract_with_spacy(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities using spaCy"""
-        doc = self.nlp(text)
+        return self._spacy_entities(self.nlp(text))
+    
+    def _spacy_entities(self, doc) -> List[Dict[str, Any]]:
+        """Collect the entities of interest from a spaCy doc"""
         entities = []
         
         for ent in doc.ents:
@@ -117,36 +373,105 @@ class BiomedicalNER:
     
     def _extract_with_transformers(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities using transformers pipeline"""
-        # Split text into chunks to avoid token limit
-        max_length = 512
-        chunks = [text[i:i+max_length] for i in range(0, len(text), max_length)]
+        return self._extract_batch_with_transformers([text])[0]
+    
+    def _extract_batch_with_transformers(self, texts: List[str], batch_size: int = 32) -> List[List[Dict[str, Any]]]:
+        """Extract entities from many texts, running at most batch_size token windows per forward pass"""
+        if not texts:
+            return []
+        
+        # Texts longer than the model's limit overflow into extra windows that
+        # overlap by `stride` tokens; offset_mapping maps every token to its characters
+        encoding = self.tokenizer(
+            texts,
+            max_length=512,
+            stride=64,
+            truncation=True,
+            padding=True,
+            return_overflowing_tokens=True,
+            return_offsets_mapping=True,
+            return_tensors="pt"
+        )
+        # Long or many abstracts can produce hundreds of windows; running them in
+        # slices keeps activation memory bounded
+        input_ids = encoding["input_ids"]
+        attention_mask = encoding["attention_mask"]
+        score_chunks, label_chunks = [], []
+        with torch.no_grad():
+            for i in range(0, len(input_ids), batch_size):
+                logits = self.model(
+                    input_ids=input_ids[i:i+batch_size].to(self.device),
+                    attention_mask=attention_mask[i:i+batch_size].to(self.device)
+                ).logits
+                chunk_scores, chunk_labels = logits.softmax(dim=-1).max(dim=-1)
+                score_chunks.append(chunk_scores.cpu())
+                label_chunks.append(chunk_labels.cpu())
+        scores = torch.cat(score_chunks)
+        label_ids = torch.cat(label_chunks)
         
-        all_entities = []
-        offset = 0
+        # (start, end, label, score) per token for each text, skipping special
+        # tokens and the part of each window already covered by the previous one
+        tokens = [[] for _ in texts]
+        covered = [0] * len(texts)
+        windows = zip(
+            encoding["overflow_to_sample_mapping"].tolist(),
+            encoding["offset_mapping"].tolist(),
+            label_ids.tolist(),
+            scores.tolist()
+        )
+        for index, offsets, window_labels, window_scores in windows:
+            for (start, end), label_id, score in zip(offsets, window_labels, window_scores):
+                if start == end or start < covered[index]:
+                    continue
+                tokens[index].append((start, end, self.model.config.id2label[label_id], score))
+            if tokens[index]:
+                covered[index] = tokens[index][-1][1]
         
-        for chunk in chunks:
-            results = self.ner(chunk)
+        return [self._group_tokens(text, text_tokens) for text, text_tokens in zip(texts, tokens)]
+    
+    def _group_tokens(self, text: str, tokens: List[tuple]) -> List[Dict[str, Any]]:
+        """Merge B-/I- tagged tokens (and word pieces) into entity spans"""
+        entities = []
+        current = None
+        
+        for start, end, label, score in tokens:
+            if label == "O":
+                current = None
+                continue
             
-            # Group by entity
-            current_entity = None
+            if label[:2] in ("B-", "I-"):
+                tag, entity_type = label[0], label[2:]
+            else:
+                tag, entity_type = "I", label
             
-            for item in results:
-                # Adjust positions based on chunk offset
-                item["start"] += offset
-                item["end"] += offset
-                
-                # Map entity types
-                entity_type = item["entity_group"]
-                mapped_type = self.categories.get(entity_type, entity_type)
-                
-                all_entities.append({
-                    "text": item["word"],
-                    "start": item["start"],
-                    "end": item["end"],
-                    "type": mapped_type,
-                    "confidence": item["score"]
-                })
+            # I- tags and word pieces directly after the previous token extend the entity
+            if current is not None and current["label"] == entity_type and (tag == "I" or start == current["end"]):
+                current["end"] = end
+                current["scores"].append(score)
+                continue
             
-            offset += len(chunk)
+            current = {"label": entity_type, "start": start, "end": end, "scores": [score]}
+            entities.append(current)
         
-        return all_entities
+        return [
+            {
+                "text": text[entity["start"]:entity["end"]],
+                "start": entity["start"],
+                "end": entity["end"],
+                "type": self.categories.get(entity["label"], entity["label"]),
+                "confidence": sum(entity["scores"]) / len(entity["scores"])
+            }
+            for entity in entities
+        ]
+
+# Process-local extractor used by BiomedicalNER.extract_entities_parallel workers
+_worker_ner = None
+
+def _init_worker(model_name: str, use_simple: bool, gene_symbols: Optional[Iterable[str]]):
+    """Build the worker process's BiomedicalNER once"""
+    global _worker_ner
+    _worker_ner = BiomedicalNER(model_name=model_name, use_simple=use_simple, gene_symbols=gene_symbols)
+
+def _extract_in_worker(text: str) -> List[Dict[str, Any]]:
+    """Extract entities from one text in a worker process"""
+    return _worker_ner.extract_entities(text)
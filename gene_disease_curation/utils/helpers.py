@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import Dict
-from ..models.state import CurationState
+from ..models.state import CurationState, ScoreIdx
 
 def print_results(results: CurationState):
     """Pretty print the curation results"""
@@ -14,15 +14,16 @@ def print_results(results: CurationState):
     if results['publication_years']:
         print(f"Publication Years: {results['publication_years'][0]} - {results['publication_years'][-1]}")
     
+    scores = results['scores']
     print(f"\nEvidence Scores:")
-    print(f"  Variant: {results['variant_score']:.2f}")
-    print(f"  Functional: {results['functional_score']:.2f}")
-    print(f"  Segregation: {results['segregation_score']:.2f}")
-    print(f"  Cohort: {results['cohort_score']:.2f}")
-    print(f"  TOTAL: {results['total_score']:.2f}")
+    print(f"  Variant: {scores[ScoreIdx.VARIANT]:.2f}")
+    print(f"  Functional: {scores[ScoreIdx.FUNCTIONAL]:.2f}")
+    print(f"  Segregation: {scores[ScoreIdx.SEGREGATION]:.2f}")
+    print(f"  Cohort: {scores[ScoreIdx.COHORT]:.2f}")
+    print(f"  TOTAL: {scores[ScoreIdx.TOTAL]:.2f}")
     
     print(f"\nClassification: {results['classification_suggestion']}")
-    print(f"Confidence: {results['confidence_level']:.2%}")
+    print(f"Confidence: {scores[ScoreIdx.CONFIDENCE]:.2%}")
     
     print(f"\nProcessing Time: {results['processing_time']:.2f}s")
 
@@ -34,16 +35,11 @@ def create_initial_state(gene: str, disease: str) -> CurationState:
         pmids=[],
         abstracts={},
         evidence_items=[],
-        variant_score=0.0,
-        functional_score=0.0,
-        segregation_score=0.0,
-        cohort_score=0.0,
-        total_score=0.0,
+        scores=[0.0] * len(ScoreIdx),
         publication_years=[],
         independent_groups=0,
         abstracts_analyzed=0,
         classification_suggestion="",
-        confidence_level=0.0,
         current_stage="start",
         errors=[],
         processing_time=0.0,
@@ -0,0 +1,46 @@
+import functools
+import os
+
+import spacy
+from sentence_transformers import SentenceTransformer
+
+# Model names loaded by the workflow's NER and embedding components
+SPACY_NER_MODEL = "en_core_sci_md"
+EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+
+# Pipeline components NER doesn't use; names missing from a model are ignored
+NER_DISABLED_PIPES = ("tagger", "parser", "lemmatizer", "attribute_ruler")
+
+@functools.lru_cache(maxsize=1)
+def spacy_gpu_active() -> bool:
+    """Move spaCy onto the GPU when one is available; True if it is in use"""
+    return bool(spacy.prefer_gpu())
+
+@functools.lru_cache(maxsize=4)
+def load_spacy(name: str, disable: tuple = ()):
+    """Load a spaCy model once per process and share it between callers"""
+    # transformer-backed pipelines run on the GPU when one is available
+    spacy_gpu_active()
+    return spacy.load(name, disable=list(disable))
+
+def load_spacy_ner(name: str = SPACY_NER_MODEL):
+    """Load a spaCy model with only the components needed for NER, or None if it isn't installed"""
+    if not spacy.util.is_package(name):
+        return None
+    return load_spacy(name, NER_DISABLED_PIPES)
+
+@functools.lru_cache(maxsize=4)
+def load_sentence_transformer(name: str) -> SentenceTransformer:
+    """Load a SentenceTransformer once per process and share it between callers"""
+    return SentenceTransformer(name)
+
+def warm_load_models():
+    """Load the NER and embedding models up front so the first workflow run doesn't pay for it"""
+    if os.environ.get("USE_SIMPLE_NER", "").lower() not in ("true", "1", "yes"):
+        if load_spacy_ner() is None:
+            print(f"spaCy model {SPACY_NER_MODEL} is not installed; NER will use the transformers model")
+    
+    try:
+        load_sentence_transformer(EMBEDDING_MODEL)
+    except Exception as e:
+        print(f"Could not preload embedding model {EMBEDDING_MODEL}: {str(e)}")
@@ -1,7 +1,15 @@
-from typing import List, Dict, Any, Optional, Union
+from typing import List, Dict, Any, Optional, Set, Union
+from functools import lru_cache, reduce
+import asyncio
 import os
+import sys
 import json
+import threading
+import weakref
 import numpy as np
+import orjson
+import pyarrow as pa
+import pyarrow.parquet as pq
 import faiss
 from .embeddings import EmbeddingModel
 
@@ -12,7 +20,8 @@ class VectorDocumentStore:
         self, 
         embedding_model: Optional[EmbeddingModel] = None,
         index_path: Optional[str] = None,
-        dimension: int = 768
+        dimension: int = 768,
+        use_gpu: bool = False
     ):
         """
         Initialize the vector document store
@@ -21,12 +30,17 @@ class VectorDocumentStore:
             embedding_model: Model for generating embeddings
             index_path: Path to load existing index
             dimension: Embedding dimension if no model or index provided
+            use_gpu: Build new indexes on the GPU when FAISS sees one
         """
         self.embedding_model = embedding_model
+        self.use_gpu = use_gpu and faiss.get_num_gpus() > 0
         
-        # Initialize document storage
-        self.documents = {}  # id -> document
-        self.doc_ids = []    # List of document IDs in order
+        # Initialize document storage as parallel columns; row i is FAISS ID i
+        self._ids: List[str] = []
+        self._texts: List[str] = []
+        self._meta: List[Dict[str, Any]] = []
+        self._id2row: Dict[str, int] = {}  # document ID -> latest row
+        self.meta_index: Dict[str, Dict[Any, Set[int]]] = {}  # metadata key -> value -> positions
         
         # Initialize FAISS index
         if index_path and os.path.exists(index_path):
@@ -35,13 +49,55 @@ class VectorDocumentStore:
             if embedding_model:
                 dimension = embedding_model.embedding_dim
             try:
-                self.index = faiss.IndexFlatIP(dimension)  # Inner product (cosine) index
+                self.index = self._create_index(dimension)
                 self.dimension = dimension
             except Exception as e:
                 print(f"Error initializing FAISS index: {str(e)}")
                 # Create a dummy index for fallback
                 self.index = None
                 self.dimension = dimension
+        
+        # Reused by every search so a query doesn't allocate its own (1, dimension) array;
+        # search is synchronous, so one buffer per store is enough
+        self._query_buffer = np.empty((1, self.dimension), dtype=np.float32)
+        
+        # Per-store LRU of query embeddings, so repeated queries skip the encoder;
+        # keyed on the model name too so swapping embedding_model can't return stale vectors
+        self._embed_query = lru_cache(maxsize=1024)(self._compute_query_embedding)
+        
+        # FAISS indexes aren't safe to add to and search concurrently, and
+        # aadd_documents adds from executor threads
+        self._index_lock = threading.Lock()
+        # One per event loop; serializes aadd_documents so batches reach the index in row order
+        self._ingest_locks: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = weakref.WeakKeyDictionary()
+    
+    def _create_index(self, dimension: int) -> faiss.Index:
+        """
+        Create an empty HNSW index over normalized vectors
+        
+        Vectors are stored as float16, halving memory and the bytes read per
+        distance computation; fp16 needs no training and loses negligible recall
+        on unit-norm embeddings. With use_gpu the index is an exact inner
+        product index on the GPU instead, since FAISS has no GPU HNSW.
+        
+        Args:
+            dimension: Embedding dimension
+            
+        Returns:
+            Inner product (cosine) index wrapped so vectors carry explicit IDs
+        """
+        if self.use_gpu:
+            self._gpu_resources = faiss.StandardGpuResources()
+            return faiss.IndexIDMap2(faiss.GpuIndexFlatIP(self._gpu_resources, dimension))
+        
+        hnsw = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT)
+        hnsw.hnsw.efConstruction = 200
+        # IDs are document rows, so labels stay valid whatever the index layout
+        return faiss.IndexIDMap2(hnsw)
+    
+    def _compute_query_embedding(self, model_name: str, query: str) -> bytes:
+        """Embed a query; returned as immutable bytes so cached vectors can't be modified"""
+        return np.asarray(self.embedding_model.embed_text(query), dtype=np.float32).tobytes()
     
     def add_documents(self, documents: List[Dict[str, Any]]) -> List[str]:
         """
@@ -63,40 +119,138 @@ class VectorDocumentStore:
         if self.embedding_model and self.index is not None:
             try:
                 embeddings = self.embedding_model.embed_texts(texts)
-                
-                # Add to FAISS index
-                if len(embeddings) > 0:
-                    faiss.normalize_L2(embeddings)  # Normalize for cosine similarity
-                    self.index.add(embeddings)
+                self._add_vectors(embeddings, len(self._ids))
                 
                 # Store documents
-                doc_ids = []
-                for i, doc in enumerate(documents):
-                    doc_id = doc.get("id", f"doc_{len(self.documents)}")
-                    self.documents[doc_id] = {
-                        "text": doc.get("text", ""),
-                        "metadata": doc.get("metadata", {})
-                    }
-                    self.doc_ids.append(doc_id)
-                    doc_ids.append(doc_id)
-                
-                return doc_ids
+                return [self._store_document(doc) for doc in documents]
             except Exception as e:
                 print(f"Error adding documents to vector store: {str(e)}")
         
         # Fallback: just store documents without embeddings
+        return [self._store_document(doc) for doc in documents]
+    
+    async def aadd_documents(self, documents: List[Dict[str, Any]], batch_size: int = 64) -> List[str]:
+        """
+        Add documents to the vector store without blocking the event loop
+        
+        Documents are embedded in micro-batches on worker threads; each batch's
+        FAISS add runs while the next batch is being embedded. Concurrent calls
+        are serialized, and searches wait for an in-progress add.
+        
+        Args:
+            documents: List of document dictionaries with 'id', 'text', and optional 'metadata'
+            batch_size: Documents per embedding batch
+            
+        Returns:
+            List of document IDs
+        """
+        if not documents:
+            return []
+        
+        if not self.embedding_model or self.index is None:
+            return self.add_documents(documents)
+        
+        loop = asyncio.get_running_loop()
+        batches = [documents[i:i+batch_size] for i in range(0, len(documents), batch_size)]
+        
+        def embed(batch):
+            texts = [doc.get("text", "") for doc in batch]
+            return loop.run_in_executor(None, self.embedding_model.embed_texts, texts)
+        
+        ingest_lock = self._ingest_locks.get(loop)
+        if ingest_lock is None:
+            ingest_lock = self._ingest_locks[loop] = asyncio.Lock()
+        
         doc_ids = []
-        for doc in documents:
-            doc_id = doc.get("id", f"doc_{len(self.documents)}")
-            self.documents[doc_id] = {
-                "text": doc.get("text", ""),
-                "metadata": doc.get("metadata", {})
-            }
-            self.doc_ids.append(doc_id)
-            doc_ids.append(doc_id)
+        stored = 0
+        async with ingest_lock:
+            try:
+                embeddings = await embed(batches[0])
+                for n, batch in enumerate(batches):
+                    add = loop.run_in_executor(None, self._add_vectors, embeddings, len(self._ids))
+                    doc_ids.extend(self._store_document(doc) for doc in batch)
+                    stored += len(batch)
+                    
+                    if n + 1 < len(batches):
+                        _, embeddings = await asyncio.gather(add, embed(batches[n + 1]))
+                    else:
+                        await add
+            except Exception as e:
+                print(f"Error adding documents to vector store: {str(e)}")
+                # Fallback: store the remaining documents without embeddings
+                doc_ids.extend(self._store_document(doc) for doc in documents[stored:])
         
         return doc_ids
     
+    def _add_vectors(self, embeddings: np.ndarray, start: int) -> None:
+        """Add embeddings to the FAISS index under IDs start, start+1, ..."""
+        # embeddings arrive unit-norm, so inner product is cosine
+        if len(embeddings) == 0:
+            return
+        with self._index_lock:
+            if isinstance(self.index, faiss.IndexIDMap2):
+                ids = np.arange(start, start + len(embeddings), dtype=np.int64)
+                self.index.add_with_ids(embeddings, ids)
+            else:
+                # index loaded from an older save without explicit IDs
+                self.index.add(embeddings)
+    
+    def _store_document(self, doc: Dict[str, Any]) -> str:
+        """Append a document as the next row and index its metadata"""
+        return self._append_row(
+            doc.get("id", f"doc_{len(self._ids)}"),
+            doc.get("text", ""),
+            doc.get("metadata", {})
+        )
+    
+    def _append_row(self, doc_id: str, text: str, metadata: Dict[str, Any]) -> str:
+        """Append one row to the document columns"""
+        row = len(self._ids)
+        if isinstance(doc_id, str):
+            doc_id = sys.intern(doc_id)  # PMIDs recur across runs and queries
+        self._ids.append(doc_id)
+        self._texts.append(text)
+        self._meta.append(metadata)
+        self._id2row[doc_id] = row
+        self._index_metadata(row, metadata)
+        return doc_id
+    
+    def get_document(self, doc_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a stored document by ID
+        
+        Args:
+            doc_id: Document ID
+            
+        Returns:
+            Document dictionary with 'id', 'text' and 'metadata', or None if not stored
+        """
+        row = self._id2row.get(doc_id)
+        if row is None:
+            return None
+        return {"id": doc_id, "text": self._texts[row], "metadata": self._meta[row]}
+    
+    def _index_metadata(self, position: int, metadata: Dict[str, Any]) -> None:
+        """Record a document position under each of its hashable metadata values"""
+        for key, value in metadata.items():
+            try:
+                self.meta_index.setdefault(key, {}).setdefault(value, set()).add(position)
+            except TypeError:
+                pass  # unhashable values (lists, dicts) are matched by scanning instead
+    
+    def _filter_positions(self, filter_dict: Dict[str, Any]) -> Set[int]:
+        """Return the positions of documents whose metadata matches every filter"""
+        try:
+            return reduce(
+                set.intersection,
+                (self.meta_index.get(key, {}).get(value, set()) for key, value in filter_dict.items())
+            )
+        except TypeError:
+            return {
+                position for position, metadata in enumerate(self._meta)
+                if self._matches_filter(metadata, filter_dict)
+            }
+    
     def search(
         self, 
         query: str, 
@@ -119,39 +273,89 @@ class VectorDocumentStore:
         
         try:
             # Generate query embedding
-            query_embedding = self.embedding_model.embed_text(query)
-            query_embedding = query_embedding.reshape(1, -1)
-            faiss.normalize_L2(query_embedding)
-            
-            # Search index
-            scores, indices = self.index.search(query_embedding, k=min(k * 4, self.index.ntotal))
-            
-            # Get document IDs
-            results = []
-            for i, idx in enumerate(indices[0]):
-                if idx < len(self.doc_ids):
-                    doc_id = self.doc_ids[idx]
-                    doc = self.documents.get(doc_id)
-                    
-                    if doc:
-                        # Apply metadata filter
-                        if filter_dict and not self._matches_filter(doc.get("metadata", {}), filter_dict):
-                            continue
-                        
-                        results.append({
-                            "id": doc_id,
-                            "text": doc.get("text", ""),
-                            "metadata": doc.get("metadata", {}),
-                            "score": float(scores[0][i])
-                        })
-            
-            # Sort by score and limit to k
-            results = sorted(results, key=lambda x: x["score"], reverse=True)[:k]
-            return results
+            embedding = self._embed_query(self.embedding_model.model_name, query)
+            np.copyto(self._query_buffer[0], np.frombuffer(embedding, dtype=np.float32))
+            return self._search_vectors(self._query_buffer, k, filter_dict)[0]
         except Exception as e:
             print(f"Error searching vector store: {str(e)}")
             return []
     
+    def search_many(
+        self,
+        queries: List[str],
+        k: int = 5,
+        filter_dict: Optional[Dict[str, Any]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Search for similar documents for several queries at once
+        
+        The queries are embedded together and searched in one FAISS call,
+        amortizing per-call overhead (and the host-to-device copy on GPU).
+        
+        Args:
+            queries: Query texts
+            k: Number of results to return per query
+            filter_dict: Dictionary of metadata filters applied to every query
+            
+        Returns:
+            One list of document dictionaries with similarity scores per query
+        """
+        if not queries or not self.embedding_model or self.index is None or self.index.ntotal == 0:
+            return [[] for _ in queries]
+        
+        try:
+            embeddings = self.embedding_model.embed_texts(queries)
+            return self._search_vectors(np.ascontiguousarray(embeddings, dtype=np.float32), k, filter_dict)
+        except Exception as e:
+            print(f"Error searching vector store: {str(e)}")
+            return [[] for _ in queries]
+    
+    def _search_vectors(
+        self,
+        vectors: np.ndarray,
+        k: int,
+        filter_dict: Optional[Dict[str, Any]]
+    ) -> List[List[Dict[str, Any]]]:
+        """Search the index for each row of vectors and materialize the hits"""
+        # Restrict the search to documents matching the metadata filter
+        allowed = None
+        selector = None
+        if filter_dict:
+            allowed = self._filter_positions(filter_dict)
+            if not allowed:
+                return [[] for _ in range(len(vectors))]
+            selector = faiss.IDSelectorBatch(np.fromiter(allowed, dtype=np.int64, count=len(allowed)))
+        
+        # Search index; results come back sorted by score
+        fetch = k
+        if self.use_gpu:
+            # GPU indexes don't take ID selectors, so filtered searches over-fetch and filter below
+            params = None
+            if allowed is not None:
+                fetch = k * 4
+        elif isinstance(self.index, faiss.IndexIDMap2):
+            params = faiss.SearchParametersHNSW(sel=selector, efSearch=max(64, k * 2))
+        else:
+            params = faiss.SearchParameters(sel=selector)
+        with self._index_lock:
+            scores, indices = self.index.search(vectors, k=min(fetch, self.index.ntotal), params=params)
+        
+        # Materialize results from the document columns
+        all_results = []
+        for row_scores, row_indices in zip(scores, indices):
+            results = []
+            for score, idx in zip(row_scores, row_indices):
+                if 0 <= idx < len(self._ids) and (allowed is None or idx in allowed):
+                    results.append({
+                        "id": self._ids[idx],
+                        "text": self._texts[idx],
+                        "metadata": self._meta[idx],
+                        "score": float(score)
+                    })
+            all_results.append(results[:k])
+        
+        return all_results
+    
     def _matches_filter(self, metadata: Dict[str, Any], filter_dict: Dict[str, Any]) -> bool:
         """Check if metadata matches filter criteria"""
         for key, value in filter_dict.items():
@@ -164,30 +368,48 @@ class VectorDocumentStore:
         try:
             self.index = faiss.read_index(index_path)
             self.dimension = self.index.d
+            self.use_gpu = False  # loaded indexes stay on the CPU; FAISS has no GPU HNSW
             
-            # Load documents
-            docs_path = index_path + ".docs.json"
+            # Load documents from the Parquet sidecar, or the JSON one written by older versions
+            docs_path = index_path + ".docs.parquet"
             if os.path.exists(docs_path):
-                with open(docs_path, "r") as f:
+                table = pq.read_table(docs_path, memory_map=True)
+                rows = zip(
+                    table.column("id").to_pylist(),
+                    table.column("text").to_pylist(),
+                    table.column("metadata").to_pylist()
+                )
+                for doc_id, text, metadata in rows:
+                    self._append_row(doc_id, text, orjson.loads(metadata))
+            elif os.path.exists(index_path + ".docs.json"):
+                with open(index_path + ".docs.json", "r") as f:
                     data = json.load(f)
-                    self.documents = data.get("documents", {})
-                    self.doc_ids = data.get("doc_ids", [])
+                documents = data.get("documents", {})
+                for doc_id in data.get("doc_ids", []):
+                    doc = documents.get(doc_id, {})
+                    self._append_row(doc_id, doc.get("text", ""), doc.get("metadata", {}))
         except Exception as e:
             print(f"Error loading index: {str(e)}")
-            self.index = faiss.IndexFlatIP(self.dimension)
+            self.index = self._create_index(self.dimension)
     
     def save_index(self, index_path: str) -> None:
         """Save FAISS index to file"""
         if self.index is not None:
             try:
-                faiss.write_index(self.index, index_path)
+                with self._index_lock:
+                    index = faiss.index_gpu_to_cpu(self.index) if self.use_gpu else self.index
+                    faiss.write_index(index, index_path)
                 
-                # Save documents
-                docs_path = index_path + ".docs.json"
-                with open(docs_path, "w") as f:
-                    json.dump({
-                        "documents": self.documents,
-                        "doc_ids": self.doc_ids
-                    }, f)
+                # Save documents as one row per index position; metadata is
+                # free-form, so it is stored as a JSON string column
+                table = pa.table({
+                    "id": pa.array(self._ids, type=pa.string()),
+                    "text": pa.array(self._texts, type=pa.string()),
+                    "metadata": pa.array(
+                        [orjson.dumps(metadata).decode("utf-8") for metadata in self._meta],
+                        type=pa.string()
+                    )
+                })
+                pq.write_table(table, index_path + ".docs.parquet")
             except Exception as e:
                 print(f"Error saving index: {str(e)}")
@@ -1,11 +1,41 @@
 from typing import List, Dict, Any, Union
 import numpy as np
-from sentence_transformers import SentenceTransformer
+
+from ..config import SETTINGS
+from ..utils.loaders import EMBEDDING_MODEL, load_sentence_transformer, load_spacy
+
+try:
+    from numba import njit, prange
+except ImportError:
+    njit = None
+
+if njit is not None:
+    @njit(parallel=True, fastmath=True, cache=True)
+    def _cosine_batch(query, candidates):
+        """Cosine similarity of query against each row of candidates, one row per thread"""
+        out = np.empty(candidates.shape[0], dtype=np.float32)
+        query_norm = np.sqrt((query * query).sum())
+        for i in prange(candidates.shape[0]):
+            dot = 0.0
+            norm = 0.0
+            for j in range(candidates.shape[1]):
+                dot += query[j] * candidates[i, j]
+                norm += candidates[i, j] * candidates[i, j]
+            out[i] = dot / (query_norm * np.sqrt(norm) + 1e-12)
+        return out
+    
+    # compile at import (or load from numba's on-disk cache) instead of on the first call
+    _cosine_batch(np.ones(2, dtype=np.float32), np.ones((1, 2), dtype=np.float32))
+else:
+    def _cosine_batch(query, candidates):
+        """Cosine similarity of query against each row of candidates"""
+        norms = np.linalg.norm(candidates, axis=1) * np.linalg.norm(query)
+        return (candidates @ query) / (norms + 1e-12)
 
 class EmbeddingModel:
     """Model for generating text embeddings"""
     
-    def __init__(self, model_name: str = "all-MiniLM-L6-v2"):
+    def __init__(self, model_name: str = EMBEDDING_MODEL):
         """
         Initialize the embedding model
         
@@ -13,14 +43,13 @@ class EmbeddingModel:
             model_name: Name of the sentence-transformers model to use
         """
         try:
-            self.model = SentenceTransformer(model_name)
+            self.model = load_sentence_transformer(model_name)
             self.embedding_dim = self.model.get_sentence_embedding_dimension()
             self.model_name = model_name
         except Exception as e:
             print(f"Error loading embedding model: {str(e)}")
             # Fallback to simple averaging of word vectors
-            import spacy
-            self.model = spacy.load("en_core_web_md")
+            self.model = load_spacy("en_core_web_md")
             self.embedding_dim = 300
             self.model_name = "spacy-en_core_web_md"
     
@@ -32,7 +61,7 @@ class EmbeddingModel:
             texts: List of text strings to embed
             
         Returns:
-            Array of embeddings with shape (len(texts), embedding_dim)
+            Array of unit-norm float32 embeddings with shape (len(texts), embedding_dim)
         """
         if not texts:
             return np.array([])
@@ -40,20 +69,28 @@ class EmbeddingModel:
         try:
             if hasattr(self.model, 'encode'):
                 # SentenceTransformer model
-                embeddings = self.model.encode(texts, convert_to_numpy=True)
+                embeddings = self.model.encode(
+                    texts,
+                    batch_size=SETTINGS["embed_batch_size"],
+                    convert_to_numpy=True,
+                    normalize_embeddings=True,
+                    show_progress_bar=False
+                )
                 return embeddings
             else:
                 # spaCy fallback
-                embeddings = np.zeros((len(texts), self.embedding_dim))
-                for i, text in enumerate(texts):
-                    doc = self.model(text)
+                embeddings = np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
+                docs = self.model.pipe(texts, batch_size=SETTINGS["embed_batch_size"])
+                for i, doc in enumerate(docs):
                     if doc.vector.any():  # Check if vector exists
                         embeddings[i] = doc.vector
+                norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+                np.divide(embeddings, norms, out=embeddings, where=norms > 0)
                 return embeddings
         except Exception as e:
             print(f"Error generating embeddings: {str(e)}")
             # Return zero vectors as fallback
-            return np.zeros((len(texts), self.embedding_dim))
+            return np.zeros((len(texts), self.embedding_dim), dtype=np.float32)
     
     def embed_text(self, text: str) -> np.ndarray:
         """
@@ -63,10 +100,10 @@ class EmbeddingModel:
             text: Text string to embed
             
         Returns:
-            Embedding vector
+            Unit-norm float32 embedding vector, as for embed_texts
         """
         embeddings = self.embed_texts([text])
-        return embeddings[0] if len(embeddings) > 0 else np.zeros(self.embedding_dim)
+        return embeddings[0] if len(embeddings) > 0 else np.zeros(self.embedding_dim, dtype=np.float32)
     
     def embed_documents(self, documents: List[Dict]) -> Dict[str, np.ndarray]:
         """
@@ -97,3 +134,21 @@ class EmbeddingModel:
             Cosine similarity score (0-1)
         """
         return np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
+    
+    def similarity_batch(self, query_embedding: np.ndarray, embeddings: np.ndarray) -> np.ndarray:
+        """
+        Calculate cosine similarity between a query and many embeddings
+        
+        Uses a parallel Numba kernel when numba is installed, NumPy otherwise.
+        
+        Args:
+            query_embedding: Query vector of shape (embedding_dim,)
+            embeddings: Candidate vectors of shape (n, embedding_dim)
+            
+        Returns:
+            Array of n cosine similarity scores
+        """
+        return _cosine_batch(
+            np.ascontiguousarray(query_embedding, dtype=np.float32),
+            np.ascontiguousarray(embeddings, dtype=np.float32)
+        )
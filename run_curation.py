@@ -6,9 +6,11 @@ import argparse
 from datetime import datetime
 
 from gene_disease_curation.config import setup_environment
+from gene_disease_curation.api.pubmed import close_pubmed_manager
 from gene_disease_curation.graph.workflow import build_curation_graph
 from gene_disease_curation.models.state import CurationState
 from gene_disease_curation.utils.helpers import create_initial_state, print_results
+from gene_disease_curation.utils.loaders import warm_load_models
 
 from dotenv import load_dotenv
 load_dotenv()
@@ -35,6 +37,7 @@ async def run_curation(gene: str, disease: str, use_simple_ner=False):
         os.environ["USE_SIMPLE_NER"] = "true"
         print("Using simple regex-based NER instead of ML models")
     
+    warm_load_models()
 
     initial_state = create_initial_state(gene, disease)
     workflow = build_curation_graph()
@@ -48,10 +51,13 @@ async def run_curation(gene: str, disease: str, use_simple_ner=False):
     thread_id = str(uuid.uuid4())
     
     config = {"configurable": {"thread_id": thread_id}}
-    final_state = await workflow.ainvoke(
-        initial_state,
-        config
-    )
+    try:
+        final_state = await workflow.ainvoke(
+            initial_state,
+            config
+        )
+    finally:
+        await close_pubmed_manager()
     
     final_state["processing_time"] = (datetime.now() - start_time).total_seconds()
     
@@ -6,15 +6,26 @@ setup(
     packages=find_packages(),
     install_requires=[
         "langchain>=0.0.267",
-        "langchain-openai>=0.0.2",
+        "langchain-openai>=0.1.21",
+        "openai>=1.13.0",
         "langgraph>=0.0.15",
         "transformers>=4.30.0",
         "sentence-transformers>=2.2.2",
         "faiss-cpu>=1.7.4",
         "spacy>=3.5.3",
-        "httpx>=0.24.1",
-        "pydantic>=1.10.8",
+        "httpx[http2,brotli]>=0.24.1",
+        "orjson>=3.9.0",
+        "pyarrow>=12.0.0",
+        "tiktoken>=0.7.0",
+        "tenacity>=8.2.0",
+        "pydantic>=2.0",
         "numpy>=1.24.3",
     ],
+    extras_require={
+        # faster regex NER: Hyperscan, or RE2 if Hyperscan is unavailable
+        "fast-regex": ["hyperscan>=0.4.0", "google-re2>=1.0", "pyahocorasick>=2.0"],
+        # JIT-compiled batched cosine similarity
+        "jit": ["numba>=0.57"],
+    },
     python_requires=">=3.8",
 )
\ No newline at end of file
@@ -1,5 +1,6 @@
 import sys
 import re
+from operator import itemgetter
 from typing import List, Dict, Any
 
 class SimpleEntityExtractor:
@@ -27,24 +28,29 @@ class SimpleEntityExtractor:
                 r'\b[A-Z][a-z]+ate\b'       # Chemicals ending in -ate
             ]
         }
+        
+        # One compiled alternation per entity type, so each type is a single pass over the text
+        self.compiled = {
+            entity_type: re.compile("|".join(f"(?:{pattern})" for pattern in patterns))
+            for entity_type, patterns in self.patterns.items()
+        }
     
     def extract_entities(self, text: str) -> List[Dict[str, Any]]:
         """Extract entities from text using regex patterns"""
         entities = []
         
-        for entity_type, patterns in self.patterns.items():
-            for pattern in patterns:
-                for match in re.finditer(pattern, text):
-                    entities.append({
-                        "text": match.group(0),
-                        "start": match.start(),
-                        "end": match.end(),
-                        "type": entity_type,
-                        "confidence": 0.8  # Fixed confidence
-                    })
+        for entity_type, regex in self.compiled.items():
+            for match in regex.finditer(text):
+                entities.append({
+                    "text": match.group(0),
+                    "start": match.start(),
+                    "end": match.end(),
+                    "type": entity_type,
+                    "confidence": 0.8  # Fixed confidence
+                })
         
         # Sort by position
-        entities.sort(key=lambda x: x["start"])
+        entities.sort(key=itemgetter("start"))
         
         return entities
 
@@ -0,0 +1,55 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("sentence_transformers")
+embeddings = pytest.importorskip("gene_disease_curation.vector_db.embeddings")
+
+TEXTS = [
+    "BRCA1 mutations increase the risk of breast cancer.",
+    "The patient carried a heterozygous missense variant.",
+    "Segregation analysis in three families supported the association.",
+]
+
+
+@pytest.fixture(scope="module")
+def sentence_transformer_model():
+    model = embeddings.EmbeddingModel()
+    if model.model_name != embeddings.EMBEDDING_MODEL:
+        pytest.skip(f"{embeddings.EMBEDDING_MODEL} could not be loaded")
+    return model
+
+
+@pytest.fixture
+def spacy_model(monkeypatch):
+    spacy = pytest.importorskip("spacy")
+    if not spacy.util.is_package("en_core_web_md"):
+        pytest.skip("en_core_web_md is not installed")
+
+    def unavailable(name):
+        raise OSError(f"{name} unavailable")
+
+    # force the fallback to spaCy word vectors
+    monkeypatch.setattr(embeddings, "load_sentence_transformer", unavailable)
+    model = embeddings.EmbeddingModel()
+    assert model.model_name == "spacy-en_core_web_md"
+    return model
+
+
+@pytest.fixture(params=["sentence_transformer_model", "spacy_model"])
+def model(request):
+    return request.getfixturevalue(request.param)
+
+
+def test_embed_texts_unit_norm_float32(model):
+    emb = model.embed_texts(TEXTS)
+    assert emb.dtype == np.float32
+    assert emb.shape == (len(TEXTS), model.embedding_dim)
+    np.testing.assert_allclose(np.linalg.norm(emb, axis=1), 1.0, atol=1e-3)
+
+
+def test_embed_text_unit_norm_float32(model):
+    emb = model.embed_text(TEXTS[0])
+    assert emb.dtype == np.float32
+    assert emb.shape == (model.embedding_dim,)
+    np.testing.assert_allclose(np.linalg.norm(emb), 1.0, atol=1e-3)
+    np.testing.assert_allclose(emb, model.embed_texts(TEXTS[:1])[0], atol=1e-5)
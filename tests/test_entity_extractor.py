@@ -0,0 +1,51 @@
+import re
+
+import pytest
+
+entity_extractor = pytest.importorskip("gene_disease_curation.ner.entity_extractor")
+
+TEXTS = [
+    "BRCA1 and TP53 mutations (p.Thr1174Ser, T174S, c.123A>G) cause Marfan syndrome "
+    "and lung cancer; Cisplatin, Sulfide and Acetate were tested.",
+    "Le gène — BRCA2 α KRAS Ωmega, Noonan syndrome; naïve breast cancer G12D étude c.35G>A",
+    "ABCDEFGH X1Y2Z ABC123 A1B lung cancer cancer tumor",
+    "HLA-B and HLA-B27 alleles; HLA typing; xHLA-B, BRCA12 and BRCA1/BRCA2 in HLA-B27HLA",
+]
+
+GENE_SYMBOLS = ["BRCA1", "BRCA2", "KRAS", "TP53", "HLA", "HLA-B", "HLA-B27", "B27"]
+
+
+def _key(entity):
+    return entity["start"], entity["type"]
+
+
+def _re_extractor(monkeypatch, **kwargs):
+    """Build an extractor on the plain re fallback path"""
+    monkeypatch.setattr(entity_extractor, "hyperscan", None)
+    monkeypatch.setattr(entity_extractor, "regex_engine", re)
+    return entity_extractor.SimpleEntityExtractor(**kwargs)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+@pytest.mark.parametrize("gene_symbols", [None, GENE_SYMBOLS])
+def test_hyperscan_matches_re(monkeypatch, text, gene_symbols):
+    pytest.importorskip("hyperscan")
+    hyperscan_extractor = entity_extractor.SimpleEntityExtractor(gene_symbols=gene_symbols)
+    assert hyperscan_extractor.database is not None
+    re_extractor = _re_extractor(monkeypatch, gene_symbols=gene_symbols)
+
+    assert sorted(hyperscan_extractor.extract_entities(text), key=_key) == \
+        sorted(re_extractor.extract_entities(text), key=_key)
+
+
+@pytest.mark.parametrize("text", TEXTS)
+def test_aho_corasick_matches_regex(monkeypatch, text):
+    pytest.importorskip("ahocorasick")
+    automaton_extractor = entity_extractor.SimpleEntityExtractor(gene_symbols=GENE_SYMBOLS)
+    # _match_genes picks its path from the module global, so match before patching it
+    automaton_genes = automaton_extractor._match_genes(text)
+
+    monkeypatch.setattr(entity_extractor, "ahocorasick", None)
+    regex_extractor = entity_extractor.SimpleEntityExtractor(gene_symbols=GENE_SYMBOLS)
+
+    assert automaton_genes == regex_extractor._match_genes(text)